@@ -398,7 +398,7 @@ export default function RecordPanel({
                     ws.onopen = async () => {
                         try {
                             const token = await generateWsToken();
-                            ws.send(JSON.stringify({ auth: token }));
+                            ws.send(JSON.stringify({ auth: token, mode: "diarize" }));
                         } catch (err) {
                             reject(new Error("Failed to get WS auth token"));
                         }
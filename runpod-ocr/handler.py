@@ -7,71 +7,289 @@ Model: stepfun-ai/GOT-OCR2_0 (Apache 2.0)
 import runpod
 import base64
 import torch
-from transformers import AutoModel, AutoTokenizer
+from transformers import AutoModel, AutoTokenizer, StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
 from PIL import Image
 import io
 import tempfile
 import os
+import threading
+import time
+from collections import OrderedDict
 
 MODEL_NAME = "stepfun-ai/GOT-OCR2_0"
+# Pinned model revision — part of the cache key, so a model upgrade never serves stale results
+MODEL_REVISION = os.environ.get("MODEL_REVISION", "main")
 
-# Pre-load model on cold start
-print(f"Loading {MODEL_NAME}...")
-tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME, trust_remote_code=True)
-model = AutoModel.from_pretrained(
-    MODEL_NAME,
-    trust_remote_code=True,
-    low_cpu_mem_usage=True,
-    device_map="cuda",
-    torch_dtype=torch.bfloat16,
-)
-model = model.eval()
-print("GOT-OCR 2.0 model loaded!")
+# Result cache for re-uploaded pages (retries, duplicate photos, desktop re-syncs)
+OCR_CACHE_SIZE = int(os.environ.get("OCR_CACHE_SIZE", "512"))  # entries, 0 = disabled
+OCR_CACHE_TTL = int(os.environ.get("OCR_CACHE_TTL", "3600"))  # seconds
+# dHash grid size: 32 → 1024-bit hash (fine enough to tell text pages apart)
+OCR_CACHE_HASH_SIZE = int(os.environ.get("OCR_CACHE_HASH_SIZE", "32"))
+# Max Hamming distance (bits) for two images to count as the same page
+OCR_CACHE_MAX_DISTANCE = int(os.environ.get("OCR_CACHE_MAX_DISTANCE", "16"))
 
+# Generation limits — GOT's chat() defaults to 4096 new tokens, which a blank/noisy page can burn through
+OCR_MAX_NEW_TOKENS = int(os.environ.get("OCR_MAX_NEW_TOKENS", "2048"))
+# Repetition guard: stop when the last N tokens are mostly the same n-grams over and over
+OCR_REPEAT_WINDOW = int(os.environ.get("OCR_REPEAT_WINDOW", "256"))  # tokens, 0 = disabled
+OCR_REPEAT_NGRAM = int(os.environ.get("OCR_REPEAT_NGRAM", "4"))
+OCR_REPEAT_MIN_DIVERSITY = float(os.environ.get("OCR_REPEAT_MIN_DIVERSITY", "0.2"))  # distinct/total n-grams
+OCR_REPEAT_CHECK_EVERY = 16  # tokens between checks
+# Streaming mode: register a RunPod generator handler that yields Markdown as it's produced
+OCR_STREAMING = os.environ.get("OCR_STREAMING", "false").lower() == "true"
 
-def handler(event):
+tokenizer = None
+model = None
+
+
+def load_model():
+    global tokenizer, model
+    print(f"Loading {MODEL_NAME}@{MODEL_REVISION}...")
+    tokenizer = AutoTokenizer.from_pretrained(
+        MODEL_NAME,
+        revision=MODEL_REVISION,
+        trust_remote_code=True,
+    )
+    model = AutoModel.from_pretrained(
+        MODEL_NAME,
+        revision=MODEL_REVISION,
+        trust_remote_code=True,
+        low_cpu_mem_usage=True,
+        device_map="cuda",
+        torch_dtype=torch.bfloat16,
+    )
+    model = model.eval()
+    print("GOT-OCR 2.0 model loaded!")
+
+
+# ── Perceptual-hash result cache ─────────────────────────────────────
+
+def perceptual_hash(image: Image.Image, hash_size: int = OCR_CACHE_HASH_SIZE) -> int:
+    """Difference hash (dHash): survives re-encoding, resizing and small exposure changes."""
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = small.tobytes()  # one byte per pixel in "L" mode
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+class OcrResultCache:
+    """
+    Bounded LRU + TTL cache: (owner, perceptual hash, ocr_type, model revision) → text.
+    Stores the hash and the recognized text (in RAM for up to OCR_CACHE_TTL), never image bytes.
+    Scoped per owner: two users' near-identical pages (same form, same app screenshot)
+    never match each other.
     """
-    RunPod handler for OCR.
 
-    Input:
-        image_base64: str - base64-encoded image (JPEG/PNG)
-        ocr_type: str - "ocr" (plain text) or "format" (Markdown structured)
+    def __init__(self, max_size: int, ttl: float, max_distance: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self._entries = OrderedDict()  # (owner, hash, ocr_type, revision) → (text, stored_at)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
 
-    Output:
-        text: str - recognized text
-        ocr_type: str - echo of input ocr_type
+    def get(self, owner: str, image_hash: int, ocr_type: str):
+        if self.max_size <= 0:
+            return None
+        self._expire()
+        key = (owner, image_hash, ocr_type, MODEL_REVISION)
+        if key not in self._entries:
+            # Near-duplicate lookup within the owner's entries: linear scan is cheap for a few hundred
+            key = next(
+                (
+                    k for k in self._entries
+                    if k[0] == owner and k[2:] == key[2:] and (k[1] ^ image_hash).bit_count() <= self.max_distance
+                ),
+                None,
+            )
+        if key is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return self._entries[key][0]
+
+    def put(self, owner: str, image_hash: int, ocr_type: str, text: str):
+        if self.max_size <= 0:
+            return
+        key = (owner, image_hash, ocr_type, MODEL_REVISION)
+        self._entries[key] = (text, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.ttl
+        # Insertion order ≈ age order, but hits reorder — scan all (bounded by max_size)
+        for key in [k for k, (_, stored_at) in self._entries.items() if stored_at < cutoff]:
+            del self._entries[key]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+        }
+
+
+ocr_cache = OcrResultCache(OCR_CACHE_SIZE, OCR_CACHE_TTL, OCR_CACHE_MAX_DISTANCE)
+
+
+# ── Bounded generation ───────────────────────────────────────────────
+
+class RepetitionStoppingCriteria(StoppingCriteria):
+    """Stops generation when the output tail degenerates into a loop (low n-gram diversity)."""
+
+    def __init__(self):
+        self.prompt_len = None
+        self.triggered = False
+
+    def __call__(self, input_ids, scores, **kwargs):
+        if self.prompt_len is None:
+            self.prompt_len = input_ids.shape[1] - 1
+        generated = input_ids.shape[1] - self.prompt_len
+        if (
+            not self.triggered
+            and OCR_REPEAT_WINDOW > 0
+            and generated >= OCR_REPEAT_WINDOW
+            and generated % OCR_REPEAT_CHECK_EVERY == 0
+        ):
+            tail = input_ids[0, -OCR_REPEAT_WINDOW:].tolist()
+            ngrams = [tuple(tail[i:i + OCR_REPEAT_NGRAM]) for i in range(len(tail) - OCR_REPEAT_NGRAM + 1)]
+            self.triggered = len(set(ngrams)) / len(ngrams) < OCR_REPEAT_MIN_DIVERSITY
+        return torch.full((input_ids.shape[0],), self.triggered, dtype=torch.bool, device=input_ids.device)
+
+
+def run_ocr(image_path: str, ocr_type: str, max_new_tokens: int, streamer=None) -> tuple[str, bool]:
+    """
+    Run GOT's chat() with our generation limits. chat() hard-codes its generate() kwargs,
+    so we wrap model.generate for the duration of the call. Returns (text, stopped_on_repetition).
+    """
+    repetition = RepetitionStoppingCriteria()
+    original_generate = model.generate
+
+    def bounded_generate(*args, **kwargs):
+        kwargs["max_new_tokens"] = min(kwargs.get("max_new_tokens", max_new_tokens), max_new_tokens)
+        kwargs["stopping_criteria"] = StoppingCriteriaList(
+            list(kwargs.get("stopping_criteria") or []) + [repetition]
+        )
+        if streamer is not None:
+            kwargs["streamer"] = streamer
+        return original_generate(*args, **kwargs)
+
+    model.generate = bounded_generate
+    try:
+        # ocr_type="ocr" → plain text output
+        # ocr_type="format" → Markdown structured output
+        result = model.chat(
+            tokenizer,
+            image_path,
+            ocr_type=ocr_type,
+        )
+    finally:
+        del model.generate  # drop the instance override, class method is visible again
+    if repetition.triggered:
+        print(f"OCR stopped early: repetition loop detected ({OCR_REPEAT_WINDOW}-token window)")
+    return result, repetition.triggered
+
+
+def prepare_request(input_data: dict):
+    """
+    Shared input handling for both handlers.
+    Returns (image, ocr_type, max_new_tokens, owner, image_hash, cached_text, error).
     """
-    input_data = event.get("input", {})
     image_base64 = input_data.get("image_base64", "")
     ocr_type = input_data.get("ocr_type", "format")  # default: Markdown
+    # Cache scope — requests without an owner id are never cached
+    owner = str(input_data.get("owner") or "")
+    use_cache = bool(owner) and not input_data.get("no_cache", False)
+    try:
+        max_new_tokens = int(input_data.get("max_new_tokens", OCR_MAX_NEW_TOKENS))
+    except (TypeError, ValueError):
+        return None, ocr_type, OCR_MAX_NEW_TOKENS, owner, None, None, "max_new_tokens must be an integer"
+    max_new_tokens = max(1, min(max_new_tokens, OCR_MAX_NEW_TOKENS))
 
     if not image_base64:
-        return {"error": "No image_base64 provided"}
+        return None, ocr_type, max_new_tokens, owner, None, None, "No image_base64 provided"
 
-    # Decode image → save to temp file (GOT requires file path)
     try:
         image_bytes = base64.b64decode(image_base64)
         image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
     except Exception as e:
-        return {"error": f"Invalid image: {str(e)}"}
+        return None, ocr_type, max_new_tokens, owner, None, None, f"Invalid image: {str(e)}"
 
+    if not use_cache:
+        return image, ocr_type, max_new_tokens, owner, None, None, None
+
+    image_hash = perceptual_hash(image)
+    cached_text = ocr_cache.get(owner, image_hash, ocr_type)
+    if cached_text is not None:
+        stats = ocr_cache.stats()
+        print(f"OCR cache hit (hit rate {stats['hit_rate']:.1%}, {stats['size']} entries)")
+    return image, ocr_type, max_new_tokens, owner, image_hash, cached_text, None
+
+
+def save_temp_image(image: Image.Image) -> str:
+    """GOT requires a file path — write a temp PNG (caller deletes it)."""
     with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as f:
         image.save(f, format="PNG")
-        temp_path = f.name
+        return f.name
+
+
+def handler(event):
+    """
+    RunPod handler for OCR.
+
+    Input:
+        image_base64: str - base64-encoded image (JPEG/PNG)
+        ocr_type: str - "ocr" (plain text) or "format" (Markdown structured)
+        max_new_tokens: int - generation cap (optional, clamped to 1..OCR_MAX_NEW_TOKENS)
+        owner: str - caller's user id; scopes the result cache (optional, no owner = no caching)
+        no_cache: bool - skip the result cache (optional, default false)
 
+    Output:
+        text: str - recognized text
+        ocr_type: str - echo of input ocr_type
+        stopped_early: bool - true if a repetition loop cut generation short
+        cached: bool - true if served from the result cache
+        cache: dict - cache hit-rate metrics
+    """
+    image, ocr_type, max_new_tokens, owner, image_hash, cached_text, error = prepare_request(event.get("input", {}))
+    if error:
+        return {"error": error}
+
+    if cached_text is not None:
+        return {
+            "text": cached_text,
+            "ocr_type": ocr_type,
+            "stopped_early": False,
+            "cached": True,
+            "cache": ocr_cache.stats(),
+        }
+
+    temp_path = save_temp_image(image)
     try:
-        # Run OCR
-        # ocr_type="ocr" → plain text output
-        # ocr_type="format" → Markdown structured output
-        result = model.chat(
-            tokenizer,
-            temp_path,
-            ocr_type=ocr_type,
-        )
+        result, stopped_early = run_ocr(temp_path, ocr_type, max_new_tokens)
+
+        # Looping output is not a result worth replaying
+        if image_hash is not None and not stopped_early:
+            ocr_cache.put(owner, image_hash, ocr_type, result)
 
         return {
             "text": result,
             "ocr_type": ocr_type,
+            "stopped_early": stopped_early,
+            "cached": False,
+            "cache": ocr_cache.stats(),
         }
     except Exception as e:
         return {"error": str(e)}
@@ -79,4 +297,74 @@ def handler(event):
         os.unlink(temp_path)
 
 
-runpod.serverless.start({"handler": handler})
+def stream_handler(event):
+    """
+    RunPod generator handler for OCR (OCR_STREAMING=true). Same input as handler().
+
+    Yields:
+        {"text": "<markdown delta>", "is_final": false}  — as tokens are produced
+        {"text": "", "is_final": true, "ocr_type", "stopped_early", "cached", "cache"}
+    """
+    image, ocr_type, max_new_tokens, owner, image_hash, cached_text, error = prepare_request(event.get("input", {}))
+    if error:
+        yield {"error": error}
+        return
+
+    if cached_text is not None:
+        yield {"text": cached_text, "is_final": False}
+        yield {
+            "text": "",
+            "is_final": True,
+            "ocr_type": ocr_type,
+            "stopped_early": False,
+            "cached": True,
+            "cache": ocr_cache.stats(),
+        }
+        return
+
+    temp_path = save_temp_image(image)
+    streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+    outcome = {}
+
+    def generate():
+        try:
+            outcome["text"], outcome["stopped_early"] = run_ocr(temp_path, ocr_type, max_new_tokens, streamer)
+        except Exception as e:
+            outcome["error"] = str(e)
+            streamer.end()  # unblock the consumer loop
+
+    worker = threading.Thread(target=generate, daemon=True)
+    worker.start()
+    try:
+        for delta in streamer:
+            if delta:
+                yield {"text": delta, "is_final": False}
+        worker.join()
+    finally:
+        os.unlink(temp_path)
+
+    if "error" in outcome:
+        yield {"error": outcome["error"]}
+        return
+
+    if image_hash is not None and not outcome["stopped_early"]:
+        ocr_cache.put(owner, image_hash, ocr_type, outcome["text"])
+
+    yield {
+        "text": "",
+        "is_final": True,
+        "ocr_type": ocr_type,
+        "stopped_early": outcome["stopped_early"],
+        "cached": False,
+        "cache": ocr_cache.stats(),
+    }
+
+
+if __name__ == "__main__":
+    # Pre-load model on cold start
+    load_model()
+
+    if OCR_STREAMING:
+        runpod.serverless.start({"handler": stream_handler, "return_aggregate_stream": True})
+    else:
+        runpod.serverless.start({"handler": handler})
@@ -0,0 +1,232 @@
+"""CPU-only tests for the GOT-OCR handler — the model is never loaded."""
+
+import base64
+import importlib.util
+import io
+from pathlib import Path
+
+import pytest
+
+np = pytest.importorskip("numpy")
+torch = pytest.importorskip("torch")
+pytest.importorskip("transformers")
+pytest.importorskip("runpod")
+Image = pytest.importorskip("PIL.Image")
+
+_spec = importlib.util.spec_from_file_location(
+    "ocr_handler", Path(__file__).resolve().parents[1] / "handler.py"
+)
+handler = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(handler)
+
+
+def page(seed: int, size=(600, 800)) -> Image.Image:
+    """Synthetic 'page': dark text-like blocks on white, layout fixed by the seed."""
+    rng = np.random.default_rng(seed)
+    pixels = np.full((size[1], size[0]), 255, dtype=np.uint8)
+    for _ in range(60):
+        x, y = rng.integers(20, size[0] - 120), rng.integers(20, size[1] - 30)
+        pixels[y:y + 12, x:x + rng.integers(30, 100)] = 30
+    return Image.fromarray(pixels).convert("RGB")
+
+
+def as_base64(image: Image.Image, fmt="PNG", **kwargs) -> str:
+    buf = io.BytesIO()
+    image.save(buf, format=fmt, **kwargs)
+    return base64.b64encode(buf.getvalue()).decode()
+
+
+def distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+# ── Perceptual hash ──────────────────────────────────────────────────
+
+def test_hash_survives_reencoding_and_resizing():
+    original = page(1)
+    jpeg = Image.open(io.BytesIO(base64.b64decode(as_base64(original, "JPEG", quality=70))))
+    resized = original.resize((450, 600))
+    h = handler.perceptual_hash(original)
+    assert distance(h, handler.perceptual_hash(jpeg)) <= handler.OCR_CACHE_MAX_DISTANCE
+    assert distance(h, handler.perceptual_hash(resized)) <= handler.OCR_CACHE_MAX_DISTANCE
+
+
+def test_hash_tells_pages_apart():
+    assert distance(handler.perceptual_hash(page(1)), handler.perceptual_hash(page(2))) > 100
+
+
+# ── Result cache ─────────────────────────────────────────────────────
+
+def make_cache(max_size=4, ttl=60, max_distance=2):
+    return handler.OcrResultCache(max_size, ttl, max_distance)
+
+
+def test_cache_hit_and_miss():
+    cache = make_cache()
+    assert cache.get("u1", 0b1010, "format") is None
+    cache.put("u1", 0b1010, "format", "tekst")
+    assert cache.get("u1", 0b1010, "format") == "tekst"
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5, "evictions": 0, "size": 1}
+
+
+def test_cache_near_duplicate_within_distance():
+    cache = make_cache(max_distance=2)
+    cache.put("u1", 0b1111_0000, "format", "tekst")
+    assert cache.get("u1", 0b1111_0011, "format") == "tekst"  # 2 bits off
+    assert cache.get("u1", 0b1111_0111, "format") is None  # 3 bits off
+
+
+def test_cache_scoped_per_owner_and_ocr_type():
+    cache = make_cache()
+    cache.put("u1", 42, "format", "tekst")
+    assert cache.get("u2", 42, "format") is None
+    assert cache.get("u2", 43, "format") is None  # near-duplicate of another owner's page
+    assert cache.get("u1", 42, "ocr") is None
+
+
+def test_cache_scoped_per_model_revision(monkeypatch):
+    cache = make_cache()
+    cache.put("u1", 42, "format", "tekst")
+    monkeypatch.setattr(handler, "MODEL_REVISION", "new-revision")
+    assert cache.get("u1", 42, "format") is None
+
+
+def test_cache_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(handler.time, "monotonic", lambda: now[0])
+    cache = make_cache(ttl=60)
+    cache.put("u1", 42, "format", "tekst")
+    now[0] += 59
+    assert cache.get("u1", 42, "format") == "tekst"
+    now[0] += 2
+    assert cache.get("u1", 42, "format") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_cache_lru_eviction():
+    cache = make_cache(max_size=2, max_distance=0)
+    cache.put("u1", 1, "format", "a")
+    cache.put("u1", 2, "format", "b")
+    cache.get("u1", 1, "format")  # 1 is now most recent
+    cache.put("u1", 4, "format", "c")
+    assert cache.get("u1", 2, "format") is None
+    assert cache.get("u1", 1, "format") == "a"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cache_disabled():
+    cache = make_cache(max_size=0)
+    cache.put("u1", 42, "format", "tekst")
+    assert cache.get("u1", 42, "format") is None
+
+
+def test_prepare_request_uses_cache_only_with_owner(monkeypatch):
+    monkeypatch.setattr(handler, "ocr_cache", make_cache(max_distance=handler.OCR_CACHE_MAX_DISTANCE))
+    image = page(3)
+    handler.ocr_cache.put("u1", handler.perceptual_hash(image), "format", "tekst")
+
+    _, _, _, owner, image_hash, cached, error = handler.prepare_request(
+        {"image_base64": as_base64(image, "JPEG", quality=80), "owner": "u1"}
+    )
+    assert (owner, cached, error) == ("u1", "tekst", None)
+
+    for input_data in ({}, {"owner": "u1", "no_cache": True}):
+        _, _, _, _, image_hash, cached, error = handler.prepare_request(
+            {"image_base64": as_base64(image), **input_data}
+        )
+        assert (image_hash, cached, error) == (None, None, None)
+
+    _, _, _, _, _, cached, _ = handler.prepare_request({"image_base64": as_base64(image), "owner": "u2"})
+    assert cached is None
+
+
+# ── Generation limits ────────────────────────────────────────────────
+
+@pytest.mark.parametrize(
+    "requested, expected",
+    [(None, handler.OCR_MAX_NEW_TOKENS), (100, 100), ("100", 100), (0, 1), (-5, 1), (10 ** 6, handler.OCR_MAX_NEW_TOKENS)],
+)
+def test_max_new_tokens_clamped(requested, expected):
+    input_data = {"image_base64": as_base64(page(4))}
+    if requested is not None:
+        input_data["max_new_tokens"] = requested
+    _, _, max_new_tokens, _, _, _, error = handler.prepare_request(input_data)
+    assert (max_new_tokens, error) == (expected, None)
+
+
+@pytest.mark.parametrize("requested", ["many", [1], {"n": 1}])
+def test_max_new_tokens_must_be_integer(requested):
+    *_, error = handler.prepare_request({"image_base64": as_base64(page(4)), "max_new_tokens": requested})
+    assert error == "max_new_tokens must be an integer"
+
+
+def drive(criterion, tokens, prompt_len=10):
+    """Feed the criterion one step at a time like generate() does; return the step it fired at."""
+    ids = list(range(1000, 1000 + prompt_len))
+    for step, token in enumerate(tokens, 1):
+        ids.append(token)
+        if criterion(torch.tensor([ids]), None).item():
+            return step
+    return None
+
+
+def test_repetition_stops_a_loop():
+    criterion = handler.RepetitionStoppingCriteria()
+    step = drive(criterion, [7, 8, 9] * 400)
+    assert step == handler.OCR_REPEAT_WINDOW
+    assert criterion.triggered
+
+
+def test_repetition_ignores_diverse_output():
+    criterion = handler.RepetitionStoppingCriteria()
+    assert drive(criterion, list(range(1200))) is None
+    assert not criterion.triggered
+
+
+def test_repetition_loop_after_real_text():
+    criterion = handler.RepetitionStoppingCriteria()
+    step = drive(criterion, list(range(500)) + [1, 2] * 400)
+    assert step is not None and step > 500
+    assert step % handler.OCR_REPEAT_CHECK_EVERY == 0
+
+
+def test_repetition_disabled(monkeypatch):
+    monkeypatch.setattr(handler, "OCR_REPEAT_WINDOW", 0)
+    assert drive(handler.RepetitionStoppingCriteria(), [5] * 600) is None
+
+
+class FakeGot:
+    """Mimics GOT's chat(): calls self.generate with its own hard-coded kwargs."""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.calls = []
+
+    def generate(self, input_ids, **kwargs):
+        self.calls.append(kwargs)
+        ids = input_ids
+        for token in self.tokens[:kwargs["max_new_tokens"]]:
+            ids = np.append(ids, [[token]], axis=1)
+            if any(c(torch.tensor(ids), None).item() for c in kwargs["stopping_criteria"]):
+                break
+        return ids
+
+    def chat(self, tokenizer, image_path, ocr_type):
+        ids = self.generate(np.zeros((1, 5), dtype=np.int64), max_new_tokens=4096, stopping_criteria=None)
+        return f"{ids.shape[1] - 5} tokens"
+
+
+def test_run_ocr_bounds_generate(monkeypatch):
+    fake = FakeGot(list(range(5000)))
+    monkeypatch.setattr(handler, "model", fake)
+    text, stopped_early = handler.run_ocr("page.png", "format", max_new_tokens=300)
+    assert (text, stopped_early) == ("300 tokens", False)
+    assert fake.calls[0]["max_new_tokens"] == 300
+    assert "generate" not in vars(fake)  # wrapper removed after the call
+
+
+def test_run_ocr_reports_repetition(monkeypatch):
+    monkeypatch.setattr(handler, "model", FakeGot([3, 4] * 2000))
+    text, stopped_early = handler.run_ocr("page.png", "format", max_new_tokens=2048)
+    assert stopped_early
+    assert text == f"{handler.OCR_REPEAT_WINDOW} tokens"
@@ -0,0 +1,625 @@
+"""
+RunPod Serverless Handler — unified GPU worker
+One pod for Bielik-11B (chat + embeddings), GOT-OCR 2.0, Parakeet TDT and Faster-Whisper.
+Models load lazily on first request and are evicted (LRU) to stay under a VRAM budget.
+Zero-retention: audio/images in RAM (or short-lived temp files) only.
+
+Input:  { "task": "chat" | "embedding" | "ocr" | "asr" | "transcribe" | "status", ... }
+        Without "task", the route is inferred from the payload (openai_route /
+        image_base64 / audio_base64), so existing clients can point here unchanged.
+Output: same shape as the dedicated worker for that task (OCR: non-streaming handler only).
+"""
+
+import base64
+import gc
+import io
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import runpod
+import numpy as np
+import torch
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+logger = logging.getLogger(__name__)
+
+# ── Config ───────────────────────────────────────────────────────────
+# VRAM budget for all resident models (GB). 0 = 90% of the GPU's total memory.
+VRAM_BUDGET_GB = float(os.environ.get("VRAM_BUDGET_GB", "0"))
+# Comma-separated models loaded at cold start / never evicted
+PRELOAD_MODELS = [m for m in os.environ.get("PRELOAD_MODELS", "").split(",") if m]
+PINNED_MODELS = {m for m in os.environ.get("PINNED_MODELS", "").split(",") if m}
+
+# Bielik (llama-cpp-python)
+BIELIK_DIR = "/models"
+BIELIK_REPO = "speakleash/Bielik-11B-v2.6-Instruct-GGUF"
+BIELIK_FILE = "Bielik-11B-v2.6-Instruct-Q8_0.gguf"
+N_GPU_LAYERS = int(os.environ.get("N_GPU_LAYERS", "-1"))
+CTX_SIZE = int(os.environ.get("CTX_SIZE", "4096"))
+# GOT-OCR
+OCR_MODEL = "stepfun-ai/GOT-OCR2_0"
+OCR_REVISION = os.environ.get("OCR_REVISION", "main")
+# Generation limits + result cache — same knobs and defaults as runpod-ocr/
+OCR_MAX_NEW_TOKENS = int(os.environ.get("OCR_MAX_NEW_TOKENS", "2048"))
+OCR_REPEAT_WINDOW = int(os.environ.get("OCR_REPEAT_WINDOW", "256"))  # tokens, 0 = disabled
+OCR_REPEAT_NGRAM = int(os.environ.get("OCR_REPEAT_NGRAM", "4"))
+OCR_REPEAT_MIN_DIVERSITY = float(os.environ.get("OCR_REPEAT_MIN_DIVERSITY", "0.2"))
+OCR_REPEAT_CHECK_EVERY = 16  # tokens between checks
+OCR_CACHE_SIZE = int(os.environ.get("OCR_CACHE_SIZE", "512"))  # entries, 0 = disabled
+OCR_CACHE_TTL = int(os.environ.get("OCR_CACHE_TTL", "3600"))  # seconds
+OCR_CACHE_HASH_SIZE = int(os.environ.get("OCR_CACHE_HASH_SIZE", "32"))
+OCR_CACHE_MAX_DISTANCE = int(os.environ.get("OCR_CACHE_MAX_DISTANCE", "16"))
+# Parakeet
+PARAKEET_MODEL = "nvidia/parakeet-tdt-0.6b-v3"
+# Faster-Whisper
+WHISPER_MODEL = os.environ.get("WHISPER_MODEL", "large-v3")
+WHISPER_COMPUTE = os.environ.get("WHISPER_COMPUTE", "float16")
+SAMPLE_RATE = 16000
+
+# Estimated VRAM per model (GB) — used before a model has been measured once
+VRAM_ESTIMATES_GB = {
+    "bielik": float(os.environ.get("BIELIK_VRAM_GB", "13.0")),
+    "ocr": float(os.environ.get("OCR_VRAM_GB", "3.0")),
+    "parakeet": float(os.environ.get("PARAKEET_VRAM_GB", "2.5")),
+    "whisper": float(os.environ.get("WHISPER_VRAM_GB", "4.5")),
+}
+
+# task → model
+TASK_MODELS = {
+    "chat": "bielik",
+    "embedding": "bielik",
+    "ocr": "ocr",
+    "asr": "parakeet",
+    "transcribe": "whisper",
+}
+
+
+# ── Model loaders ────────────────────────────────────────────────────
+# Heavy imports live inside the loaders: a pod that never sees OCR traffic
+# never pays for importing transformers remote code, and so on.
+
+def load_bielik():
+    from huggingface_hub import hf_hub_download
+    from llama_cpp import Llama
+    model_path = os.path.join(BIELIK_DIR, BIELIK_FILE)
+    if not os.path.exists(model_path):
+        logger.info(f"Downloading {BIELIK_FILE} from {BIELIK_REPO}...")
+        os.makedirs(BIELIK_DIR, exist_ok=True)
+        hf_hub_download(repo_id=BIELIK_REPO, filename=BIELIK_FILE, local_dir=BIELIK_DIR)
+    return Llama(
+        model_path=model_path,
+        n_gpu_layers=N_GPU_LAYERS,
+        n_ctx=CTX_SIZE,
+        embedding=True,
+        verbose=False,
+    )
+
+
+def load_ocr():
+    from transformers import AutoModel, AutoTokenizer
+    tokenizer = AutoTokenizer.from_pretrained(OCR_MODEL, revision=OCR_REVISION, trust_remote_code=True)
+    model = AutoModel.from_pretrained(
+        OCR_MODEL,
+        revision=OCR_REVISION,
+        trust_remote_code=True,
+        low_cpu_mem_usage=True,
+        device_map="cuda",
+        torch_dtype=torch.bfloat16,
+    )
+    return tokenizer, model.eval()
+
+
+def load_parakeet():
+    import nemo.collections.asr as nemo_asr
+    return nemo_asr.models.ASRModel.from_pretrained(PARAKEET_MODEL)
+
+
+def load_whisper():
+    from faster_whisper import WhisperModel
+    return WhisperModel(WHISPER_MODEL, device="cuda", compute_type=WHISPER_COMPUTE)
+
+
+MODEL_LOADERS = {
+    "bielik": load_bielik,
+    "ocr": load_ocr,
+    "parakeet": load_parakeet,
+    "whisper": load_whisper,
+}
+
+
+# ── Model registry (lazy load + LRU eviction) ────────────────────────
+
+def gpu_free_bytes() -> int:
+    """Free device memory as seen by the driver — covers llama.cpp/CTranslate2 allocations too."""
+    if not torch.cuda.is_available():
+        return 0
+    free, _ = torch.cuda.mem_get_info()
+    return free
+
+
+class ModelRegistry:
+    """
+    Keeps loaded models in LRU order and evicts the least recently used ones
+    until the next model fits in the VRAM budget. Pinned models are never evicted.
+    """
+
+    def __init__(self, budget_bytes: int):
+        self.budget_bytes = budget_bytes
+        self._models = OrderedDict()  # name → model object
+        self._sizes = {}  # name → measured VRAM bytes (kept after eviction)
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+        self.last_load_sec = {}
+
+    def size_of(self, name: str) -> int:
+        return self._sizes.get(name, int(VRAM_ESTIMATES_GB[name] * 1024 ** 3))
+
+    def used_bytes(self) -> int:
+        return sum(self.size_of(name) for name in self._models)
+
+    def get(self, name: str):
+        with self._lock:
+            if name in self._models:
+                self._models.move_to_end(name)
+                return self._models[name]
+
+            needed = self.size_of(name)
+            for victim in [m for m in self._models if m not in PINNED_MODELS]:
+                if self.used_bytes() + needed <= self.budget_bytes:
+                    break
+                self._evict(victim)
+            if self.used_bytes() + needed > self.budget_bytes:
+                logger.warning(f"{name} ({needed / 1024 ** 3:.1f}GB) may not fit the VRAM budget — loading anyway")
+
+            logger.info(f"Loading model: {name}...")
+            free_before = gpu_free_bytes()
+            start = time.monotonic()
+            model = MODEL_LOADERS[name]()
+            elapsed = time.monotonic() - start
+            measured = free_before - gpu_free_bytes()
+            if measured > 0:
+                self._sizes[name] = measured
+            self._models[name] = model
+            self.loads += 1
+            self.last_load_sec[name] = round(elapsed, 2)
+            logger.info(f"Model {name} loaded in {elapsed:.1f}s ({self.size_of(name) / 1024 ** 3:.1f}GB)")
+            return model
+
+    def _evict(self, name: str):
+        logger.info(f"Evicting model: {name} (LRU)")
+        del self._models[name]
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        self.evictions += 1
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "loaded": list(self._models),
+                "used_gb": round(self.used_bytes() / 1024 ** 3, 2),
+                "budget_gb": round(self.budget_bytes / 1024 ** 3, 2),
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "last_load_sec": dict(self.last_load_sec),
+            }
+
+
+def default_budget_bytes() -> int:
+    if VRAM_BUDGET_GB > 0:
+        return int(VRAM_BUDGET_GB * 1024 ** 3)
+    if torch.cuda.is_available():
+        return int(torch.cuda.get_device_properties(0).total_memory * 0.9)
+    return int(24 * 1024 ** 3)
+
+
+registry = ModelRegistry(default_budget_bytes())
+
+
+# ── Post-processing (shared by ASR tasks) ────────────────────────────
+HALLUCINATION_PATTERNS = [
+    "wszelkie prawa zastrzeżone",
+    "napisy stworzone przez",
+    "napisy wykonał",
+    "subskrybuj",
+    "subscribe",
+    "dziękuję za uwagę",
+    "dziękuję za obejrzenie",
+    "do zobaczenia",
+    "thanks for watching",
+    "copyright",
+    "all rights reserved",
+    "tłumaczenie",
+    "amara.org",
+]
+
+
+def is_hallucination(text: str) -> bool:
+    lower = text.lower().strip().rstrip(".")
+    return lower in HALLUCINATION_PATTERNS
+
+
+FILLER_PATTERNS = [
+    r'\b(no|noo|nooo)\b(?![\w-])',
+    r'\b(znaczy)\b',
+    r'\b(wiesz)\b',
+    r'\b(tak jakby)\b',
+    r'\b(ee+|yyy+|hmm+|aaa+|eee+)\b',
+]
+
+
+def clean_transcript(text: str) -> str:
+    """Basic regex cleanup: remove filler words, fix capitalization."""
+    if not text:
+        return text
+    for pattern in FILLER_PATTERNS:
+        text = re.sub(pattern, '', text, flags=re.IGNORECASE)
+    text = re.sub(r'\b(\w+)(\s+\1){1,}\b', r'\1', text, flags=re.IGNORECASE)
+    text = re.sub(r'\s*,\s*,', ',', text)
+    text = re.sub(r'\s{2,}', ' ', text).strip()
+    text = re.sub(r'\.\s+([a-ząćęłńóśźż])', lambda m: '. ' + m.group(1).upper(), text)
+    if text:
+        text = text[0].upper() + text[1:]
+    if text and text[-1] not in '.!?':
+        text += '.'
+    return text
+
+
+# ── OCR: bounded generation + result cache (same as runpod-ocr/) ─────
+
+def perceptual_hash(image, hash_size: int = OCR_CACHE_HASH_SIZE) -> int:
+    """Difference hash (dHash): survives re-encoding, resizing and small exposure changes."""
+    from PIL import Image
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = small.tobytes()  # one byte per pixel in "L" mode
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+class OcrResultCache:
+    """
+    Bounded LRU + TTL cache: (owner, perceptual hash, ocr_type, revision) → text.
+    Recognized text stays in RAM for up to OCR_CACHE_TTL; near-duplicates match
+    only within the same owner's entries.
+    """
+
+    def __init__(self, max_size: int, ttl: float, max_distance: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self._entries = OrderedDict()  # (owner, hash, ocr_type, revision) → (text, stored_at)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, owner: str, image_hash: int, ocr_type: str):
+        if self.max_size <= 0:
+            return None
+        cutoff = time.monotonic() - self.ttl
+        for key in [k for k, (_, stored_at) in self._entries.items() if stored_at < cutoff]:
+            del self._entries[key]
+        key = (owner, image_hash, ocr_type, OCR_REVISION)
+        if key not in self._entries:
+            key = next(
+                (
+                    k for k in self._entries
+                    if k[0] == owner and k[2:] == key[2:] and (k[1] ^ image_hash).bit_count() <= self.max_distance
+                ),
+                None,
+            )
+        if key is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return self._entries[key][0]
+
+    def put(self, owner: str, image_hash: int, ocr_type: str, text: str):
+        if self.max_size <= 0:
+            return
+        key = (owner, image_hash, ocr_type, OCR_REVISION)
+        self._entries[key] = (text, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+        }
+
+
+ocr_cache = OcrResultCache(OCR_CACHE_SIZE, OCR_CACHE_TTL, OCR_CACHE_MAX_DISTANCE)
+
+
+def generate_ocr(tokenizer, model, image_path: str, ocr_type: str, max_new_tokens: int) -> tuple[str, bool]:
+    """GOT chat() with the token cap + repetition guard. Returns (text, stopped_on_repetition)."""
+    from transformers import StoppingCriteria, StoppingCriteriaList
+
+    class RepetitionStoppingCriteria(StoppingCriteria):
+        """Stops generation when the output tail degenerates into a loop (low n-gram diversity)."""
+
+        def __init__(self):
+            self.prompt_len = None
+            self.triggered = False
+
+        def __call__(self, input_ids, scores, **kwargs):
+            if self.prompt_len is None:
+                self.prompt_len = input_ids.shape[1] - 1
+            generated = input_ids.shape[1] - self.prompt_len
+            if (
+                not self.triggered
+                and OCR_REPEAT_WINDOW > 0
+                and generated >= OCR_REPEAT_WINDOW
+                and generated % OCR_REPEAT_CHECK_EVERY == 0
+            ):
+                tail = input_ids[0, -OCR_REPEAT_WINDOW:].tolist()
+                ngrams = [tuple(tail[i:i + OCR_REPEAT_NGRAM]) for i in range(len(tail) - OCR_REPEAT_NGRAM + 1)]
+                self.triggered = len(set(ngrams)) / len(ngrams) < OCR_REPEAT_MIN_DIVERSITY
+            return torch.full((input_ids.shape[0],), self.triggered, dtype=torch.bool, device=input_ids.device)
+
+    repetition = RepetitionStoppingCriteria()
+    original_generate = model.generate
+
+    # chat() hard-codes its generate() kwargs — wrap generate for the duration of the call
+    def bounded_generate(*args, **kwargs):
+        kwargs["max_new_tokens"] = min(kwargs.get("max_new_tokens", max_new_tokens), max_new_tokens)
+        kwargs["stopping_criteria"] = StoppingCriteriaList(
+            list(kwargs.get("stopping_criteria") or []) + [repetition]
+        )
+        return original_generate(*args, **kwargs)
+
+    model.generate = bounded_generate
+    try:
+        text = model.chat(tokenizer, image_path, ocr_type=ocr_type)
+    finally:
+        del model.generate  # drop the instance override, class method is visible again
+    if repetition.triggered:
+        logger.info(f"OCR stopped early: repetition loop detected ({OCR_REPEAT_WINDOW}-token window)")
+    return text, repetition.triggered
+
+
+# ── Embedding encoding (same options as runpod/handler.py) ───────────
+# "float" = JSON list (default, unchanged); the others are base64 of little-endian
+# float32 / int8 (+ per-vector "scale") / sign bits packed MSB-first
+EMBEDDING_FORMATS = ("float", "base64", "int8", "binary")
+
+
+def encode_embedding(embedding: list, encoding_format: str = "float", dimensions=None) -> dict:
+    """Truncate to `dimensions` (re-normalised to unit length) and quantise."""
+    if encoding_format not in EMBEDDING_FORMATS:
+        raise ValueError(f"encoding_format must be one of {', '.join(EMBEDDING_FORMATS)}")
+    if encoding_format == "float" and not dimensions:
+        return {"embedding": embedding}
+
+    vec = np.asarray(embedding, dtype=np.float32)
+    if vec.ndim != 1:
+        raise ValueError("Compact embedding encodings need a pooled (1-D) embedding")
+    if dimensions:
+        dimensions = int(dimensions)
+        if not 0 < dimensions <= vec.size:
+            raise ValueError(f"dimensions must be between 1 and {vec.size}")
+        vec = vec[:dimensions]
+    norm = float(np.linalg.norm(vec))
+    if norm > 0:
+        vec = vec / norm
+
+    result = {"encoding_format": encoding_format, "dimensions": int(vec.size)}
+    if encoding_format == "float":
+        result["embedding"] = vec.tolist()
+        return result
+    if encoding_format == "base64":
+        data = vec.astype("<f4").tobytes()
+    elif encoding_format == "int8":
+        peak = float(np.abs(vec).max())
+        scale = peak / 127 if peak > 0 else 1.0
+        data = np.round(vec / scale).astype(np.int8).tobytes()
+        result["scale"] = scale
+    else:
+        data = np.packbits(vec > 0).tobytes()
+    result["embedding"] = base64.b64encode(data).decode("ascii")
+    return result
+
+
+# ── Task handlers ────────────────────────────────────────────────────
+
+def run_chat(input_data: dict) -> dict:
+    llm = registry.get("bielik")
+    payload = input_data.get("openai_input", input_data)
+    return llm.create_chat_completion(
+        messages=payload.get("messages", []),
+        max_tokens=payload.get("max_tokens", 1024),
+        temperature=payload.get("temperature", 0.7),
+    )
+
+
+def run_embedding(input_data: dict) -> dict:
+    llm = registry.get("bielik")
+    payload = input_data.get("openai_input", input_data)
+    text = payload.get("content", payload.get("input", ""))
+    result = llm.create_embedding(text)
+    return encode_embedding(
+        result["data"][0]["embedding"],
+        payload.get("encoding_format", "float"),
+        payload.get("dimensions"),
+    )
+
+
+def run_ocr(input_data: dict) -> dict:
+    image_base64 = input_data.get("image_base64", "")
+    ocr_type = input_data.get("ocr_type", "format")
+    # Cache scope — requests without an owner id are never cached
+    owner = str(input_data.get("owner") or "")
+    use_cache = bool(owner) and not input_data.get("no_cache", False)
+    try:
+        max_new_tokens = int(input_data.get("max_new_tokens", OCR_MAX_NEW_TOKENS))
+    except (TypeError, ValueError):
+        return {"error": "max_new_tokens must be an integer"}
+    max_new_tokens = max(1, min(max_new_tokens, OCR_MAX_NEW_TOKENS))
+    if not image_base64:
+        return {"error": "No image_base64 provided"}
+
+    from PIL import Image
+    try:
+        image = Image.open(io.BytesIO(base64.b64decode(image_base64))).convert("RGB")
+    except Exception as e:
+        return {"error": f"Invalid image: {str(e)}"}
+
+    image_hash = None
+    if use_cache:
+        image_hash = perceptual_hash(image)
+        cached_text = ocr_cache.get(owner, image_hash, ocr_type)
+        if cached_text is not None:
+            return {
+                "text": cached_text,
+                "ocr_type": ocr_type,
+                "stopped_early": False,
+                "cached": True,
+                "cache": ocr_cache.stats(),
+            }
+
+    tokenizer, model = registry.get("ocr")
+    # GOT requires a file path
+    with tempfile.NamedTemporaryFile(suffix=".png", delete=True) as f:
+        image.save(f, format="PNG")
+        f.flush()
+        text, stopped_early = generate_ocr(tokenizer, model, f.name, ocr_type, max_new_tokens)
+
+    # Looping output is not a result worth replaying
+    if image_hash is not None and not stopped_early:
+        ocr_cache.put(owner, image_hash, ocr_type, text)
+    return {
+        "text": text,
+        "ocr_type": ocr_type,
+        "stopped_early": stopped_early,
+        "cached": False,
+        "cache": ocr_cache.stats(),
+    }
+
+
+def run_asr(input_data: dict) -> dict:
+    """Parakeet — voice notes."""
+    audio_base64 = input_data.get("audio_base64", "")
+    if not audio_base64:
+        return {"error": "Missing audio_base64"}
+
+    model = registry.get("parakeet")
+    audio_bytes = base64.b64decode(audio_base64)
+    # NeMo requires a file path
+    with tempfile.NamedTemporaryFile(suffix=".wav", delete=True) as tmp:
+        tmp.write(audio_bytes)
+        tmp.flush()
+        result = model.transcribe([tmp.name])
+    # ZERO-RETENTION
+    del audio_bytes
+
+    if isinstance(result, list) and len(result) > 0:
+        text = result[0].text if hasattr(result[0], "text") else str(result[0])
+    else:
+        text = str(result)
+    text = text.strip()
+
+    if is_hallucination(text):
+        return {"text": ""}
+    return {"text": clean_transcript(text)}
+
+
+def run_transcribe(input_data: dict) -> dict:
+    """Faster-Whisper — uploaded recordings (WAV or raw 16kHz Int16 PCM)."""
+    audio_base64 = input_data.get("audio_base64", "")
+    if not audio_base64:
+        return {"error": "Missing audio_base64"}
+
+    model = registry.get("whisper")
+    audio_bytes = base64.b64decode(audio_base64)
+    if len(audio_bytes) > 44 and audio_bytes[:4] == b'RIFF':
+        import soundfile as sf
+        audio_float, sr = sf.read(io.BytesIO(audio_bytes), dtype="float32")
+        if audio_float.ndim > 1:
+            audio_float = audio_float[:, 0]  # mono
+        if sr != SAMPLE_RATE:
+            indices = np.arange(0, len(audio_float), sr / SAMPLE_RATE).astype(int)
+            audio_float = audio_float[indices[indices < len(audio_float)]]
+    else:
+        audio_float = np.frombuffer(audio_bytes, dtype=np.int16).astype(np.float32) / 32768.0
+    del audio_bytes
+
+    segments, _ = model.transcribe(
+        audio_float,
+        language=input_data.get("language", "pl"),
+        temperature=0.0,
+        beam_size=5,
+        vad_filter=True,
+    )
+    text = " ".join(seg.text.strip() for seg in segments).strip()
+    # ZERO-RETENTION
+    del audio_float
+
+    if is_hallucination(text):
+        return {"text": ""}
+    return {"text": clean_transcript(text)}
+
+
+TASK_HANDLERS = {
+    "chat": run_chat,
+    "embedding": run_embedding,
+    "ocr": run_ocr,
+    "asr": run_asr,
+    "transcribe": run_transcribe,
+}
+
+
+def infer_task(input_data: dict) -> str:
+    """Route requests shaped for the dedicated workers."""
+    if "openai_route" in input_data or "messages" in input_data:
+        route = input_data.get("openai_route", "/v1/chat/completions")
+        return "embedding" if route in ("/embedding", "/v1/embeddings") else "chat"
+    if "image_base64" in input_data:
+        return "ocr"
+    if "audio_base64" in input_data:
+        return "asr"
+    return ""
+
+
+def handler(event):
+    """RunPod handler — routes by task to a lazily loaded model."""
+    input_data = event.get("input", {})
+    task = input_data.get("task") or infer_task(input_data)
+
+    if task == "status":
+        return registry.status()
+    if task not in TASK_HANDLERS:
+        return {"error": f"Unknown task: {task!r}"}
+
+    try:
+        start = time.monotonic()
+        result = TASK_HANDLERS[task](input_data)
+        logger.info(f"Task {task} done in {time.monotonic() - start:.2f}s")
+        return result
+    except Exception as e:
+        logger.error(f"Task {task} error: {e}")
+        return {"error": str(e)}
+
+
+if __name__ == "__main__":
+    # Warm the models the pod is expected to serve most
+    for name in PRELOAD_MODELS:
+        registry.get(name)
+
+    runpod.serverless.start({"handler": handler})
@@ -0,0 +1,200 @@
+"""CPU-only tests for the unified worker — loaders are replaced with fakes, nothing is downloaded."""
+
+import base64
+import importlib.util
+import io
+from pathlib import Path
+
+import pytest
+
+np = pytest.importorskip("numpy")
+torch = pytest.importorskip("torch")
+pytest.importorskip("transformers")
+pytest.importorskip("runpod")
+Image = pytest.importorskip("PIL.Image")
+
+_spec = importlib.util.spec_from_file_location(
+    "unified_handler", Path(__file__).resolve().parents[1] / "handler.py"
+)
+handler = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(handler)
+
+GB = 1024 ** 3
+
+
+# ── Model registry ───────────────────────────────────────────────────
+
+@pytest.fixture
+def loads(monkeypatch):
+    """Fake loaders with fixed sizes; returns the list of loaded names in order."""
+    loaded = []
+    monkeypatch.setattr(handler, "gpu_free_bytes", lambda: 0)
+    monkeypatch.setattr(handler, "VRAM_ESTIMATES_GB", {"a": 4.0, "b": 4.0, "c": 4.0})
+    monkeypatch.setattr(
+        handler,
+        "MODEL_LOADERS",
+        {name: (lambda name=name: loaded.append(name) or f"model-{name}") for name in "abc"},
+    )
+    return loaded
+
+
+def test_registry_loads_lazily_and_reuses(loads):
+    registry = handler.ModelRegistry(10 * GB)
+    assert registry.status()["loaded"] == []
+    assert registry.get("a") == "model-a"
+    assert registry.get("a") == "model-a"
+    assert loads == ["a"]
+
+
+def test_registry_evicts_least_recently_used(loads):
+    registry = handler.ModelRegistry(10 * GB)
+    registry.get("a")
+    registry.get("b")
+    registry.get("a")  # b is now least recently used
+    registry.get("c")
+    status = registry.status()
+    assert status["loaded"] == ["a", "c"]
+    assert (status["loads"], status["evictions"]) == (3, 1)
+
+
+def test_registry_never_evicts_pinned(loads, monkeypatch):
+    monkeypatch.setattr(handler, "PINNED_MODELS", {"a"})
+    registry = handler.ModelRegistry(10 * GB)
+    registry.get("a")
+    registry.get("b")
+    registry.get("c")
+    assert registry.status()["loaded"] == ["a", "c"]
+
+
+def test_registry_uses_measured_size(loads, monkeypatch):
+    free = iter([10 * GB, 9 * GB])  # loading "a" took 1 GB, not the 4 GB estimate
+    monkeypatch.setattr(handler, "gpu_free_bytes", lambda: next(free, 0))
+    registry = handler.ModelRegistry(10 * GB)
+    registry.get("a")
+    assert registry.size_of("a") == 1 * GB
+    registry.get("b")
+    registry.get("c")  # 1 + 4 + 4 fits — nothing evicted
+    assert registry.status()["evictions"] == 0
+
+
+# ── Routing ──────────────────────────────────────────────────────────
+
+@pytest.mark.parametrize(
+    "input_data, task",
+    [
+        ({"messages": []}, "chat"),
+        ({"openai_route": "/v1/embeddings", "openai_input": {}}, "embedding"),
+        ({"image_base64": "x"}, "ocr"),
+        ({"audio_base64": "x"}, "asr"),
+        ({}, ""),
+    ],
+)
+def test_infer_task(input_data, task):
+    assert handler.infer_task(input_data) == task
+
+
+def test_handler_rejects_unknown_task():
+    assert handler.handler({"input": {"task": "paint"}}) == {"error": "Unknown task: 'paint'"}
+
+
+# ── OCR ──────────────────────────────────────────────────────────────
+
+class FakeGot:
+    """Mimics GOT's chat(): calls self.generate with its own hard-coded kwargs."""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.calls = []
+
+    def generate(self, input_ids, **kwargs):
+        self.calls.append(kwargs)
+        ids = input_ids
+        for token in self.tokens[:kwargs["max_new_tokens"]]:
+            ids = torch.cat([ids, torch.tensor([[token]])], dim=1)
+            if any(c(ids, None).item() for c in kwargs["stopping_criteria"]):
+                break
+        return ids
+
+    def chat(self, tokenizer, image_path, ocr_type):
+        ids = self.generate(torch.zeros((1, 5), dtype=torch.long), max_new_tokens=4096, stopping_criteria=None)
+        return f"{ids.shape[1] - 5} tokens"
+
+
+@pytest.fixture
+def got(monkeypatch):
+    fake = FakeGot(list(range(5000)))
+    monkeypatch.setattr(handler, "registry", type("Registry", (), {"get": lambda self, name: (None, fake)})())
+    monkeypatch.setattr(
+        handler, "ocr_cache", handler.OcrResultCache(8, 60, handler.OCR_CACHE_MAX_DISTANCE)
+    )
+    return fake
+
+
+def image_base64() -> str:
+    pixels = np.full((200, 300), 255, dtype=np.uint8)
+    pixels[50:60, 40:200] = 0
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, format="PNG")
+    return base64.b64encode(buf.getvalue()).decode()
+
+
+def test_run_ocr_clamps_max_new_tokens(got):
+    result = handler.run_ocr({"image_base64": image_base64(), "max_new_tokens": 10 ** 6})
+    assert got.calls[0]["max_new_tokens"] == handler.OCR_MAX_NEW_TOKENS
+    assert result["text"] == f"{handler.OCR_MAX_NEW_TOKENS} tokens"
+    assert handler.run_ocr({"image_base64": "x", "max_new_tokens": "many"}) == {
+        "error": "max_new_tokens must be an integer"
+    }
+
+
+def test_run_ocr_stops_on_repetition(got):
+    got.tokens = [3, 4] * 2000
+    result = handler.run_ocr({"image_base64": image_base64(), "owner": "u1"})
+    assert result["stopped_early"]
+    assert result["cache"]["size"] == 0  # looping output is not cached
+
+
+def test_run_ocr_cache_scoped_per_owner(got):
+    first = handler.run_ocr({"image_base64": image_base64(), "owner": "u1", "max_new_tokens": 20})
+    again = handler.run_ocr({"image_base64": image_base64(), "owner": "u1"})
+    other = handler.run_ocr({"image_base64": image_base64(), "owner": "u2", "max_new_tokens": 30})
+    anonymous = handler.run_ocr({"image_base64": image_base64(), "max_new_tokens": 40})
+    assert (first["cached"], again["cached"], other["cached"], anonymous["cached"]) == (False, True, False, False)
+    assert (again["text"], other["text"], anonymous["text"]) == ("20 tokens", "30 tokens", "40 tokens")
+    assert len(got.calls) == 3
+
+
+# ── Embedding encoding ───────────────────────────────────────────────
+
+EMBEDDING = np.random.default_rng(0).standard_normal(1024).tolist()
+
+
+def test_embedding_formats():
+    assert handler.encode_embedding(EMBEDDING) == {"embedding": EMBEDDING}
+    reference = np.asarray(EMBEDDING[:256], dtype=np.float32)
+    reference /= np.linalg.norm(reference)
+
+    result = handler.encode_embedding(EMBEDDING, "base64", 256)
+    restored = np.frombuffer(base64.b64decode(result["embedding"]), dtype="<f4")
+    np.testing.assert_allclose(restored, reference, rtol=1e-6)
+
+    result = handler.encode_embedding(EMBEDDING, "int8", 256)
+    restored = np.frombuffer(base64.b64decode(result["embedding"]), dtype=np.int8) * result["scale"]
+    assert float(restored @ reference / np.linalg.norm(restored)) > 0.999
+
+    result = handler.encode_embedding(EMBEDDING, "binary", 256)
+    bits = np.unpackbits(np.frombuffer(base64.b64decode(result["embedding"]), dtype=np.uint8))
+    assert bits.tolist() == [int(v > 0) for v in EMBEDDING[:256]]
+
+
+@pytest.mark.parametrize("encoding_format, dimensions", [("float16", None), ("int8", 2048)])
+def test_embedding_invalid_requests(encoding_format, dimensions):
+    with pytest.raises(ValueError):
+        handler.encode_embedding(EMBEDDING, encoding_format, dimensions)
+
+
+def test_run_embedding_passes_format(monkeypatch):
+    llm = type("Llm", (), {"create_embedding": lambda self, text: {"data": [{"embedding": EMBEDDING}]}})()
+    monkeypatch.setattr(handler, "registry", type("Registry", (), {"get": lambda self, name: llm})())
+    result = handler.run_embedding({"openai_input": {"input": "tekst", "encoding_format": "int8", "dimensions": 128}})
+    assert (result["encoding_format"], result["dimensions"]) == ("int8", 128)
@@ -0,0 +1,492 @@
+"""
+Load-test / replay benchmark for the Faster-Whisper WebSocket server.
+
+Replays 16kHz mono Int16 PCM over N concurrent WebSocket sessions at real-time
+or accelerated speed and reports latency percentiles and throughput:
+
+  - time to first text (connect → first partial)
+  - per-window latency (audio that completes a window sent → partial received)
+  - final latency (STOP sent → final transcript received)
+  - ping RTT and dropped pings (a blocked event loop shows up here first)
+  - throughput (audio seconds transcribed per wall-clock second) and RSS per session
+  - uplink bandwidth per session (--codec opus sends 20 ms Opus packets instead of PCM)
+
+By default the server runs in-process with the stub backend (bench/stub_backend.py),
+so it runs on a CPU-only box and in CI. --backend real loads the real models;
+--url targets an already running server instead.
+
+Usage:
+  python bench/loadtest.py --sessions 20 --duration 60 --speed 4
+  python bench/loadtest.py --sessions 8 --audio meeting.wav --diarize-fraction 0.5
+  python bench/loadtest.py --sessions 20 --inference-workers 0,1   # supervisor mode, 2 workers
+  python bench/loadtest.py --sessions 10 --codec opus --opus-loss 0.02   # Opus with 2% dropped frames
+  python bench/loadtest.py --url wss://POD_ID-8765.proxy.runpod.net --token "$TOKEN" --sessions 4
+  python bench/loadtest.py --sessions 20 --speed 4 --max-window-p95 3 --max-dropped-pings 0   # CI gate
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+import wave
+from dataclasses import dataclass, field
+
+import numpy as np
+import websockets
+
+SAMPLE_RATE = 16000
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_DIR = os.path.dirname(BENCH_DIR)
+
+
+@dataclass
+class SessionResult:
+    session: int
+    diarize: bool
+    audio_sec: float = 0.0
+    connected_at: float = 0.0
+    first_text_at: float = 0.0
+    stop_sent_at: float = 0.0
+    final_at: float = 0.0
+    window_latencies: list = field(default_factory=list)
+    ping_rtts: list = field(default_factory=list)
+    dropped_pings: int = 0
+    partials: int = 0
+    queued: bool = False
+    tiers: dict = field(default_factory=dict)  # QoS tier → partials decoded at that tier
+    bytes_sent: int = 0
+    error: str = ""
+
+
+# ── Audio ────────────────────────────────────────────────────────────
+
+def load_audio(path: str) -> bytes:
+    """Raw 16kHz mono Int16 PCM, or a WAV file in that format."""
+    if path.lower().endswith(".wav"):
+        with wave.open(path, "rb") as w:
+            if w.getframerate() != SAMPLE_RATE or w.getnchannels() != 1 or w.getsampwidth() != 2:
+                raise SystemExit(f"{path}: expected 16kHz mono Int16 WAV")
+            return w.readframes(w.getnframes())
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def synthetic_audio(duration_sec: float, silence_every_sec: float = 20.0, seed: int = 0) -> bytes:
+    """Speech-like amplitude-modulated noise with a 2s pause every silence_every_sec."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(duration_sec * SAMPLE_RATE)) / SAMPLE_RATE
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4.0 * t) ** 2  # ~syllable rate
+    audio = rng.normal(0, 0.1, len(t)) * envelope
+    if silence_every_sec > 0:
+        audio[(t % silence_every_sec) > silence_every_sec - 2.0] = 0.0
+    return (np.clip(audio, -1, 1) * 32767).astype(np.int16).tobytes()
+
+
+def fit_duration(pcm: bytes, duration_sec: float) -> bytes:
+    """Loop or trim the recording to the requested duration."""
+    target = int(duration_sec * SAMPLE_RATE) * 2
+    if not pcm:
+        return pcm
+    repeats = target // len(pcm) + 1
+    return (pcm * repeats)[:target]
+
+
+def pcm_messages(pcm: bytes, chunk_ms: int) -> list[tuple[bytes, float]]:
+    """Raw PCM chunks as (payload, audio seconds sent once this message is out)."""
+    chunk_bytes = int(chunk_ms / 1000 * SAMPLE_RATE) * 2
+    return [
+        (pcm[offset:offset + chunk_bytes], (offset + chunk_bytes) / 2 / SAMPLE_RATE)
+        for offset in range(0, len(pcm), chunk_bytes)
+    ]
+
+
+def opus_messages(pcm: bytes, bitrate: int, frame_ms: int = 20) -> list[tuple[bytes, float]]:
+    """20 ms Opus packets (in-band FEC on), each prefixed with the 2-byte sequence number the server expects."""
+    import opuslib
+    import opuslib.api.ctl
+    import opuslib.api.encoder
+    encoder = opuslib.Encoder(SAMPLE_RATE, 1, opuslib.APPLICATION_VOIP)
+    encoder.bitrate = bitrate
+    # Encoder.inband_fec's setter is broken in opuslib 3.0.1 — go through the ctl directly
+    opuslib.api.encoder.encoder_ctl(encoder.encoder_state, opuslib.api.ctl.set_inband_fec, 1)
+    encoder.packet_loss_perc = 5
+    frame_bytes = SAMPLE_RATE * frame_ms // 1000 * 2
+    messages = []
+    for seq, offset in enumerate(range(0, len(pcm), frame_bytes)):
+        frame = pcm[offset:offset + frame_bytes].ljust(frame_bytes, b"\0")
+        packet = encoder.encode(frame, frame_bytes // 2)
+        messages.append(((seq & 0xFFFF).to_bytes(2, "big") + packet, (offset + frame_bytes) / 2 / SAMPLE_RATE))
+    return messages
+
+
+def window_boundaries(audio_sec: float, window_sec: float, overlap_sec: float) -> list[float]:
+    """Audio offsets (seconds) at which the server's buffer reaches a full window."""
+    boundaries = []
+    position = window_sec
+    while position <= audio_sec:
+        boundaries.append(position)
+        position += window_sec - overlap_sec
+    return boundaries
+
+
+# ── Client ───────────────────────────────────────────────────────────
+
+async def run_session(index: int, url: str, pcm: bytes, messages: list, args, diarize: bool,
+                      start_delay: float) -> SessionResult:
+    result = SessionResult(session=index, diarize=diarize, audio_sec=len(pcm) / 2 / SAMPLE_RATE)
+    await asyncio.sleep(start_delay)
+
+    rng = random.Random(index)
+    boundaries = window_boundaries(result.audio_sec, args.window_sec, args.overlap_sec)
+    boundary_sent_at = []  # send times of chunks completing each window (FIFO-matched to partials)
+    final_received = asyncio.Event()
+
+    try:
+        async with websockets.connect(url, max_size=10 * 1024 * 1024, ping_interval=None) as ws:
+            result.connected_at = time.monotonic()
+            if args.token:
+                await ws.send(json.dumps({"auth": args.token}))
+            if args.codec != "pcm":
+                await ws.send(json.dumps({"codec": args.codec}))
+
+            async def receiver():
+                async for message in ws:
+                    data = json.loads(message)
+                    now = time.monotonic()
+                    if data.get("error"):
+                        result.error = f"{data.get('code')}: {data['error']}"
+                        final_received.set()
+                        return
+                    if data.get("status") == "queued":
+                        result.queued = True
+                    if "text" not in data:
+                        continue  # status messages
+                    if data.get("is_final"):
+                        result.final_at = now
+                        final_received.set()
+                        return
+                    result.partials += 1
+                    tier = data.get("tier", "n/a")
+                    result.tiers[tier] = result.tiers.get(tier, 0) + 1
+                    if not result.first_text_at:
+                        result.first_text_at = now
+                    if len(result.window_latencies) < len(boundary_sent_at):
+                        result.window_latencies.append(now - boundary_sent_at[len(result.window_latencies)])
+
+            async def pinger():
+                while not final_received.is_set():
+                    await asyncio.sleep(args.ping_interval)
+                    sent = time.monotonic()
+                    try:
+                        pong = await ws.ping()
+                        await asyncio.wait_for(pong, timeout=args.ping_timeout)
+                        result.ping_rtts.append(time.monotonic() - sent)
+                    except asyncio.TimeoutError:
+                        result.dropped_pings += 1
+                    except websockets.exceptions.ConnectionClosed:
+                        return
+
+            receive_task = asyncio.create_task(receiver())
+            ping_task = asyncio.create_task(pinger())
+
+            if diarize:
+                await ws.send(json.dumps({"mode": "diarize"}))
+
+            stream_start = time.monotonic()
+            next_boundary = 0
+            for payload, sent_sec in messages:
+                if final_received.is_set():
+                    break  # server closed the session early (error)
+                # Simulated uplink drops (client discarding frames under backpressure)
+                if not (args.codec == "opus" and rng.random() < args.opus_loss):
+                    await ws.send(payload)
+                    result.bytes_sent += len(payload)
+                while next_boundary < len(boundaries) and sent_sec >= boundaries[next_boundary]:
+                    boundary_sent_at.append(time.monotonic())
+                    next_boundary += 1
+                if args.speed > 0:
+                    # Pace against the session clock so send overhead doesn't accumulate drift
+                    delay = stream_start + sent_sec / args.speed - time.monotonic()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                else:
+                    await asyncio.sleep(0)
+
+            result.stop_sent_at = time.monotonic()
+            await ws.send("STOP")
+            try:
+                await asyncio.wait_for(final_received.wait(), timeout=args.final_timeout)
+            except asyncio.TimeoutError:
+                result.error = result.error or "final transcript timeout"
+            ping_task.cancel()
+            receive_task.cancel()
+    except Exception as e:
+        result.error = result.error or f"{type(e).__name__}: {e}"
+    return result
+
+
+# ── In-process server ────────────────────────────────────────────────
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+async def start_local_server(args):
+    """Import server.py with the chosen backend and serve it on an ephemeral port."""
+    os.environ["MAX_CONNECTIONS_PER_IP"] = str(args.sessions + 1)  # all clients share 127.0.0.1
+    os.environ.setdefault("WS_TOKEN_SECRET", "")
+    if args.inference_workers:
+        os.environ["INFERENCE_WORKERS"] = args.inference_workers
+    sys.path.insert(0, SERVER_DIR)
+    import server
+
+    if args.backend == "stub":
+        sys.path.insert(0, BENCH_DIR)
+        import stub_backend
+        stub_backend.install(
+            server,
+            decode_rtf=args.stub_rtf,
+            base_delay=args.stub_base_delay,
+            diarize_rtf=args.stub_diarize_rtf,
+        )
+
+    loader = asyncio.create_task(server.load_models())
+    ws_server = await websockets.serve(
+        server.handle_client,
+        "127.0.0.1",
+        0,
+        max_size=10 * 1024 * 1024,
+        ping_interval=30,
+        ping_timeout=10,
+    )
+    port = ws_server.sockets[0].getsockname()[1]
+    args.window_sec = server.BUFFER_DURATION_SEC
+    args.overlap_sec = server.OVERLAP_DURATION_SEC
+    return server, ws_server, loader, f"ws://127.0.0.1:{port}"
+
+
+async def sample_memory(server, peaks: dict, stop: asyncio.Event):
+    while not stop.is_set():
+        peaks["rss"] = max(peaks["rss"], rss_bytes())
+        if server is not None:
+            peaks["buffers"] = max(peaks["buffers"], sum(server.session_buffer_bytes.values()))
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=0.25)
+        except asyncio.TimeoutError:
+            pass
+
+
+# ── Report ───────────────────────────────────────────────────────────
+
+def percentiles(values: list) -> dict:
+    if not values:
+        return {"n": 0}
+    arr = np.asarray(values)
+    return {
+        "n": len(values),
+        "p50": round(float(np.percentile(arr, 50)), 4),
+        "p90": round(float(np.percentile(arr, 90)), 4),
+        "p95": round(float(np.percentile(arr, 95)), 4),
+        "p99": round(float(np.percentile(arr, 99)), 4),
+        "max": round(float(arr.max()), 4),
+    }
+
+
+def histogram_mean(histogram, stage: str):
+    """Mean of a labelled prometheus_client histogram (server-side decode RTF), None if empty."""
+    total = count = 0.0
+    for metric in histogram.collect():
+        for sample in metric.samples:
+            if sample.labels.get("stage") != stage:
+                continue
+            if sample.name.endswith("_sum"):
+                total = sample.value
+            elif sample.name.endswith("_count"):
+                count = sample.value
+    return round(total / count, 4) if count else None
+
+
+def build_report(results: list, wall_sec: float, peaks: dict, baseline_rss: int, args, server=None) -> dict:
+    ok = [r for r in results if not r.error]
+    audio_sec = sum(r.audio_sec for r in ok)
+    return {
+        "config": {
+            "sessions": args.sessions,
+            "speed": args.speed,
+            "backend": "external" if args.url else args.backend,
+            "audio_sec_per_session": results[0].audio_sec if results else 0,
+            "chunk_ms": args.chunk_ms,
+            "codec": args.codec,
+            "stub_rtf": args.stub_rtf if not args.url and args.backend == "stub" else None,
+            "profile": server.WHISPER_PROFILE if server else None,
+            "model": server.WHISPER_MODEL if server else None,
+            "decode_workers": server.DECODE_WORKERS if server else None,
+            "inference_workers": len(server.worker_pool.workers) if server and server.worker_pool else None,
+        },
+        "sessions_ok": len(ok),
+        "sessions_failed": len(results) - len(ok),
+        "sessions_queued": sum(1 for r in results if r.queued),
+        "errors": sorted({r.error for r in results if r.error}),
+        "time_to_first_text_sec": percentiles([r.first_text_at - r.connected_at for r in ok if r.first_text_at]),
+        "window_latency_sec": percentiles([x for r in ok for x in r.window_latencies]),
+        "final_latency_sec": percentiles([r.final_at - r.stop_sent_at for r in ok if r.final_at]),
+        "ping_rtt_sec": percentiles([x for r in results for x in r.ping_rtts]),
+        "dropped_pings": sum(r.dropped_pings for r in results),
+        "partials": sum(r.partials for r in ok),
+        "partials_by_tier": {
+            tier: sum(r.tiers.get(tier, 0) for r in ok)
+            for tier in sorted({t for r in ok for t in r.tiers})
+        },
+        "uplink_kbps_per_session": round(
+            sum(r.bytes_sent * 8 / 1000 / r.audio_sec for r in results if r.audio_sec) / max(len(results), 1), 1
+        ),
+        "wall_sec": round(wall_sec, 2),
+        "throughput_x_realtime": round(audio_sec / wall_sec, 2) if wall_sec > 0 else 0.0,
+        # Server-side decode seconds per audio second (in-process only)
+        "decode_rtf_mean": histogram_mean(server.DECODE_RTF, "window") if server else None,
+        "peak_buffered_audio_mb": round(peaks["buffers"] / 1024 ** 2, 2),
+        "rss_per_session_mb": (
+            round((peaks["rss"] - baseline_rss) / max(args.sessions, 1) / 1024 ** 2, 2)
+            if not args.url else None
+        ),
+    }
+
+
+def print_report(report: dict):
+    print(f"\n=== WebSocket load test: {report['config']['sessions']} sessions, "
+          f"speed {report['config']['speed']}x, backend {report['config']['backend']} ===")
+    print(f"sessions ok/failed:      {report['sessions_ok']}/{report['sessions_failed']}"
+          f" ({report['sessions_queued']} queued for admission)")
+    for error in report["errors"]:
+        print(f"  error: {error}")
+    print(f"{'metric':<24}{'n':>6}{'p50':>9}{'p90':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for key in ("time_to_first_text_sec", "window_latency_sec", "final_latency_sec", "ping_rtt_sec"):
+        p = report[key]
+        if not p["n"]:
+            print(f"{key:<24}{0:>6}")
+            continue
+        print(f"{key:<24}{p['n']:>6}{p['p50']:>9.3f}{p['p90']:>9.3f}{p['p95']:>9.3f}{p['p99']:>9.3f}{p['max']:>9.3f}")
+    print(f"dropped pings:           {report['dropped_pings']}")
+    if report["partials_by_tier"]:
+        tiers = ", ".join(f"{tier}={n}" for tier, n in report["partials_by_tier"].items())
+        print(f"partials by QoS tier:    {tiers}")
+    print(f"throughput:              {report['throughput_x_realtime']}x real-time ({report['wall_sec']}s wall)")
+    print(f"uplink per session:      {report['uplink_kbps_per_session']} kbit/s ({report['config']['codec']})")
+    if report["decode_rtf_mean"] is not None:
+        print(f"decode RTF (mean):       {report['decode_rtf_mean']}")
+    print(f"peak buffered audio:     {report['peak_buffered_audio_mb']} MB")
+    if report["rss_per_session_mb"] is not None:
+        print(f"RSS per session:         {report['rss_per_session_mb']} MB")
+
+
+def check_thresholds(report: dict, args) -> list[str]:
+    failures = []
+    if report["sessions_failed"]:
+        failures.append(f"{report['sessions_failed']} sessions failed")
+    window = report["window_latency_sec"]
+    if args.max_window_p95 is not None and window["n"] and window["p95"] > args.max_window_p95:
+        failures.append(f"window latency p95 {window['p95']}s > {args.max_window_p95}s")
+    ping = report["ping_rtt_sec"]
+    if args.max_ping_p99 is not None and ping["n"] and ping["p99"] > args.max_ping_p99:
+        failures.append(f"ping RTT p99 {ping['p99']}s > {args.max_ping_p99}s")
+    if args.max_dropped_pings is not None and report["dropped_pings"] > args.max_dropped_pings:
+        failures.append(f"{report['dropped_pings']} dropped pings > {args.max_dropped_pings}")
+    rtf = report["decode_rtf_mean"]
+    if args.max_decode_rtf is not None and rtf is not None and rtf > args.max_decode_rtf:
+        failures.append(f"decode RTF {rtf} > {args.max_decode_rtf}")
+    return failures
+
+
+async def run(args) -> dict:
+    server = ws_server = loader = None
+    if args.url:
+        url = args.url
+    else:
+        server, ws_server, loader, url = await start_local_server(args)
+
+    pcm = fit_duration(load_audio(args.audio) if args.audio else synthetic_audio(args.duration), args.duration)
+    messages = opus_messages(pcm, args.opus_bitrate) if args.codec == "opus" else pcm_messages(pcm, args.chunk_ms)
+    baseline_rss = rss_bytes()
+    peaks = {"rss": baseline_rss, "buffers": 0}
+    stop_sampling = asyncio.Event()
+    sampler = asyncio.create_task(sample_memory(server, peaks, stop_sampling))
+
+    n_diarize = int(round(args.sessions * args.diarize_fraction))
+    start = time.monotonic()
+    results = await asyncio.gather(*(
+        run_session(
+            i, url, pcm, messages, args,
+            diarize=i < n_diarize,
+            start_delay=args.ramp_sec * i / max(args.sessions, 1),
+        )
+        for i in range(args.sessions)
+    ))
+    wall_sec = time.monotonic() - start
+
+    stop_sampling.set()
+    await sampler
+    if ws_server is not None:
+        ws_server.close()
+        await ws_server.wait_closed()
+        loader.cancel()
+    return build_report(results, wall_sec, peaks, baseline_rss, args, server)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=10, help="concurrent WebSocket sessions")
+    parser.add_argument("--duration", type=float, default=60.0, help="audio seconds per session")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed (1 = real time, 0 = unpaced)")
+    parser.add_argument("--audio", help="16kHz mono Int16 PCM (.raw) or WAV; default: synthetic speech-like noise")
+    parser.add_argument("--chunk-ms", type=int, default=250, help="audio per WebSocket message (PCM)")
+    parser.add_argument("--codec", choices=("pcm", "opus"), default="pcm", help="audio transport (opus needs opuslib)")
+    parser.add_argument("--opus-bitrate", type=int, default=24000, help="Opus encoder bitrate (bit/s)")
+    parser.add_argument("--opus-loss", type=float, default=0.0, help="share of Opus frames the client drops")
+    parser.add_argument("--ramp-sec", type=float, default=1.0, help="spread session starts over this many seconds")
+    parser.add_argument("--diarize-fraction", type=float, default=0.0, help="share of sessions in diarize mode")
+    parser.add_argument("--ping-interval", type=float, default=1.0)
+    parser.add_argument("--ping-timeout", type=float, default=2.0, help="pong later than this counts as dropped")
+    parser.add_argument("--final-timeout", type=float, default=300.0)
+    parser.add_argument("--url", help="benchmark an already running server instead of an in-process one")
+    parser.add_argument("--token", default="", help="auth token for --url (HMAC token from Convex)")
+    parser.add_argument("--backend", choices=("stub", "real"), default="stub", help="in-process backend")
+    parser.add_argument("--stub-rtf", type=float, default=0.1, help="stub decode seconds per audio second")
+    parser.add_argument("--stub-base-delay", type=float, default=0.05, help="stub fixed decode overhead (s)")
+    parser.add_argument("--stub-diarize-rtf", type=float, default=0.05)
+    parser.add_argument("--inference-workers", default="",
+                        help="in-process supervisor mode: INFERENCE_WORKERS, e.g. 0,1 (stub: one process each)")
+    parser.add_argument("--window-sec", type=float, default=12.0, help="server window (read from server.py in-process)")
+    parser.add_argument("--overlap-sec", type=float, default=2.0, help="server overlap (read from server.py in-process)")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--max-window-p95", type=float, help="fail if window latency p95 exceeds this (s)")
+    parser.add_argument("--max-ping-p99", type=float, help="fail if ping RTT p99 exceeds this (s)")
+    parser.add_argument("--max-dropped-pings", type=int, help="fail if more pings are dropped")
+    parser.add_argument("--max-decode-rtf", type=float, help="fail if mean server decode RTF exceeds this (in-process)")
+    parser.add_argument("--verbose", action="store_true", help="show server logs")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.INFO)
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    failures = check_thresholds(report, args)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
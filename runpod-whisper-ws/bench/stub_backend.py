@@ -0,0 +1,161 @@
+"""
+Stub ASR / VAD / diarization backend for the load-test harness.
+
+Replaces the model objects inside server.py (not the server functions), so
+transcribe(), transcribe_with_speakers(), the decode pool and handle_client
+all run unchanged — only inference is simulated with a configurable delay.
+In supervisor mode the stubs are installed in every inference worker too.
+Runs on a CPU-only box with numpy + websockets + prometheus-client.
+"""
+
+import functools
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+# Frames quieter than this (RMS, float32 scale) count as silence
+SILENCE_RMS = 0.01
+WORDS_PER_SEC = 2.5
+
+
+@dataclass
+class StubWord:
+    start: float
+    end: float
+    word: str
+
+
+@dataclass
+class StubSegment:
+    start: float
+    end: float
+    text: str
+    words: list = field(default_factory=list)
+
+
+@dataclass
+class StubTurn:
+    start: float
+    end: float
+
+
+def speech_regions(audio: np.ndarray, frame_sec: float = 0.5) -> list[tuple[float, float]]:
+    """Energy-based stand-in for Silero-VAD: merged (start, end) seconds of non-silent frames."""
+    frame = int(frame_sec * SAMPLE_RATE)
+    regions = []
+    for i in range(0, len(audio), frame):
+        chunk = audio[i:i + frame]
+        if len(chunk) and float(np.sqrt(np.mean(chunk ** 2))) >= SILENCE_RMS:
+            start, end = i / SAMPLE_RATE, (i + len(chunk)) / SAMPLE_RATE
+            if regions and regions[-1][1] >= start:
+                regions[-1] = (regions[-1][0], end)
+            else:
+                regions.append((start, end))
+    return regions
+
+
+class StubWhisperModel:
+    """
+    Mimics faster_whisper.WhisperModel.transcribe(): sleeps base_delay + rtf × audio seconds,
+    scaled by the decoding options so QoS tiers have a measurable effect
+    (greedy ≈ half the cost of beam 5).
+    """
+
+    def __init__(self, rtf: float = 0.1, base_delay: float = 0.05):
+        self.rtf = rtf
+        self.base_delay = base_delay
+        self._counter = 0
+
+    def transcribe(self, audio, word_timestamps=False, beam_size=5, condition_on_previous_text=True, **kwargs):
+        duration = len(audio) / SAMPLE_RATE
+        cost = (0.4 + 0.12 * beam_size) * (1.0 if condition_on_previous_text else 0.9)
+        time.sleep(self.base_delay + self.rtf * cost * duration)
+
+        segments = []
+        for start, end in speech_regions(audio):
+            n_words = max(1, int((end - start) * WORDS_PER_SEC))
+            step = (end - start) / n_words
+            words = []
+            for i in range(n_words):
+                self._counter += 1
+                words.append(StubWord(start + i * step, start + (i + 1) * step, f"słowo{self._counter}"))
+            segments.append(StubSegment(
+                start=start,
+                end=end,
+                text=" ".join(w.word for w in words),
+                words=words if word_timestamps else [],
+            ))
+        return segments, None
+
+
+class StubDiarization:
+    def __init__(self, turns):
+        self._turns = turns
+
+    def itertracks(self, yield_label=False):
+        for start, end, speaker in self._turns:
+            yield StubTurn(start, end), None, speaker
+
+
+class StubDiarizePipeline:
+    """Mimics a pyannote Pipeline: alternates two speakers every turn_sec, sleeps rtf × audio seconds."""
+
+    def __init__(self, rtf: float = 0.05, turn_sec: float = 5.0):
+        self.rtf = rtf
+        self.turn_sec = turn_sec
+
+    def __call__(self, path):
+        import soundfile as sf
+        audio, _ = sf.read(path, dtype="float32")
+        duration = len(audio) / SAMPLE_RATE
+        time.sleep(self.rtf * duration)
+        turns = []
+        start, speaker = 0.0, 0
+        while start < duration:
+            end = min(start + self.turn_sec, duration)
+            turns.append((start, end, f"SPEAKER_{speaker:02d}"))
+            start, speaker = end, 1 - speaker
+        return StubDiarization(turns)
+
+
+def stub_get_speech_timestamps(tensor, model, sampling_rate=SAMPLE_RATE, **kwargs):
+    audio = tensor.numpy() if hasattr(tensor, "numpy") else np.asarray(tensor)
+    return [
+        {"start": int(start * sampling_rate), "end": int(end * sampling_rate)}
+        for start, end in speech_regions(audio)
+    ]
+
+
+def install(server, decode_rtf: float = 0.1, base_delay: float = 0.05, diarize_rtf: float = 0.05,
+            diarize: bool = True):
+    """Swap server.py's model loaders for stubs. Call before server.load_models() runs."""
+
+    def load_whisper():
+        server.whisper_model = StubWhisperModel(rtf=decode_rtf, base_delay=base_delay)
+
+    def load_vad():
+        server.vad_model = None
+        server.get_speech_timestamps = stub_get_speech_timestamps
+
+    def load_diarize():
+        if diarize:
+            server.diarize_pipeline = StubDiarizePipeline(rtf=diarize_rtf)
+            server.model_status["diarize"] = "ready"
+        else:
+            server.model_status["diarize"] = "disabled"
+
+    def load_qos_model():
+        if server.QOS_FALLBACK_MODEL:
+            server.qos_model = StubWhisperModel(rtf=decode_rtf * 0.4, base_delay=base_delay)
+            server.model_status["qos_model"] = "ready"
+
+    server.load_whisper = load_whisper
+    server.load_vad = load_vad
+    server.load_diarize = load_diarize
+    server.load_qos_model = load_qos_model
+    # Supervisor mode (INFERENCE_WORKERS): each worker process installs the stubs for itself
+    server.worker_setup = functools.partial(
+        install, decode_rtf=decode_rtf, base_delay=base_delay, diarize_rtf=diarize_rtf, diarize=diarize,
+    )
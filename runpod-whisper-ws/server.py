@@ -3,12 +3,25 @@ RunPod Pod — Faster-Whisper WebSocket Server
 Live streaming transcription with Silero-VAD and zero-retention.
 
 Protocol:
-  Client → Server: binary audio chunks (16kHz mono Int16 PCM)
-  Server → Client: JSON {"text": "...", "is_final": false}
+  Client → Server: optional ?mode=diarize in the URL or {"auth": "...", "mode": "diarize"} — admission class
+  Server → Client: JSON {"status": "loading"} / {"status": "ready"} while models load at startup
+  Server → Client: JSON {"status": "queued", "position": n} ... {"status": "admitted"} when the pod is full
+  Client → Server: optional ?codec=opus, {"auth": ..., "codec": "opus"} or {"codec": "opus"} before audio
+  Server → Client: JSON {"status": "codec_enabled", "codec": "opus"}  (415 + close if unavailable)
+  Client → Server: binary audio chunks (16kHz mono Int16 PCM), or with Opus one packet per
+                   message prefixed by a 2-byte big-endian sequence number
+  Server → Client: JSON {"text": "...", "is_final": false, "tier": "full"}  (tier = QoS decoding tier)
   Client → Server: text "STOP" to close
   Server → Client: JSON {"text": "full transcript", "is_final": true}
 
 Zero-retention: audio never touches disk, cleared from RAM after processing.
+
+Startup: the WebSocket and HTTP ports are bound immediately; models load in
+background threads. GET /health on the HTTP port reports readiness.
+
+Multi-GPU: INFERENCE_WORKERS=auto|0,1,... runs one inference worker process per
+GPU; this process keeps the sockets, limits and metrics and routes each session
+to the least-loaded worker (audio handed over through shared memory).
 """
 
 import asyncio
@@ -20,10 +33,12 @@ import os
 import re
 import struct
 import tempfile
+from urllib.parse import parse_qs, urlparse
 import numpy as np
-import torch
 import websockets
-from faster_whisper import WhisperModel
+from websockets.protocol import State
+from concurrent.futures import ThreadPoolExecutor
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
 logger = logging.getLogger(__name__)
@@ -31,9 +46,21 @@ logger = logging.getLogger(__name__)
 # ── Config ───────────────────────────────────────────────────────────
 WS_HOST = "0.0.0.0"
 WS_PORT = int(os.environ.get("WS_PORT", "8765"))
-WHISPER_MODEL = os.environ.get("WHISPER_MODEL", "large-v3")
-WHISPER_DEVICE = os.environ.get("WHISPER_DEVICE", "cuda")
-WHISPER_COMPUTE = os.environ.get("WHISPER_COMPUTE", "float16")
+# Inference profile: "gpu" (large-v3, float16, beam 5) or "cpu" (int8, smaller model, greedy)
+WHISPER_PROFILE = os.environ.get("WHISPER_PROFILE", "gpu").lower()
+_CPU = WHISPER_PROFILE == "cpu"
+# distil-large-v3 is English-only, so the CPU profile defaults to multilingual "medium"
+WHISPER_MODEL = os.environ.get("WHISPER_MODEL", "medium" if _CPU else "large-v3")
+# Loaded instead if WHISPER_MODEL fails to load (e.g. not enough RAM/VRAM); empty = no fallback
+WHISPER_FALLBACK_MODEL = os.environ.get("WHISPER_FALLBACK_MODEL", "small" if _CPU else "")
+WHISPER_DEVICE = os.environ.get("WHISPER_DEVICE", "cpu" if _CPU else "cuda")
+WHISPER_COMPUTE = os.environ.get("WHISPER_COMPUTE", "int8" if _CPU else "float16")
+WHISPER_BEAM_SIZE = int(os.environ.get("WHISPER_BEAM_SIZE", "1" if _CPU else "5"))
+# CPU thread sizing: each concurrent decode gets WHISPER_CPU_THREADS cores,
+# and the decode pool is sized for the expected number of live sessions
+CPU_COUNT = os.cpu_count() or 1
+WHISPER_CPU_THREADS = int(os.environ.get("WHISPER_CPU_THREADS", str(min(4, CPU_COUNT))))
+WHISPER_EXPECTED_SESSIONS = int(os.environ.get("WHISPER_EXPECTED_SESSIONS", "4"))
 SAMPLE_RATE = 16000
 # Minimum audio duration to attempt transcription (seconds)
 MIN_AUDIO_SEC = 1.0
@@ -55,6 +82,64 @@ ALLOW_LOCALHOST = os.environ.get("ALLOW_LOCALHOST", "false").lower() == "true"
 # Payload size limits
 MAX_AUDIO_BUFFER_BYTES = int(os.environ.get("MAX_AUDIO_BUFFER_BYTES", str(150 * 1024 * 1024)))  # 150MB WS
 MAX_HTTP_BODY_BYTES = int(os.environ.get("MAX_HTTP_BODY_BYTES", str(75 * 1024 * 1024)))  # 75MB HTTP
+# Opus transport: lost frames concealed per gap (FEC/PLC); the rest of a longer dropout is skipped
+OPUS_MAX_CONCEAL_FRAMES = int(os.environ.get("OPUS_MAX_CONCEAL_FRAMES", "5"))
+# Vendored Silero-VAD checkout (torch.hub source="local") — no network on restart
+SILERO_VAD_DIR = os.environ.get("SILERO_VAD_DIR", "/app/silero-vad")
+# How long a session connecting during startup waits for models before being deferred
+MODEL_WAIT_TIMEOUT_SEC = float(os.environ.get("MODEL_WAIT_TIMEOUT_SEC", "120"))
+# Retry hint (seconds) sent to deferred clients
+MODEL_RETRY_AFTER_SEC = int(os.environ.get("MODEL_RETRY_AFTER_SEC", "15"))
+# Decode thread pool — keeps the event loop (pings, other sessions) responsive during inference.
+# GPU: 1 (decodes serialise on the device anyway). CPU: one worker per expected session, capped by cores.
+DECODE_WORKERS = int(os.environ.get(
+    "DECODE_WORKERS",
+    str(max(1, min(WHISPER_EXPECTED_SESSIONS, CPU_COUNT // WHISPER_CPU_THREADS))) if _CPU else "1",
+))
+# Supervisor mode: one inference worker process per entry, sessions routed to the least-loaded one.
+# Comma-separated GPU indexes ("0,1,2,3"; repeat an index for replicas on one GPU) or "auto" (all GPUs).
+# Empty = single process, models loaded in-process.
+INFERENCE_WORKERS = os.environ.get("INFERENCE_WORKERS", "").strip()
+# Per-session trace spans in the log (stage timings only, never transcript text)
+TRACE_SESSIONS = os.environ.get("TRACE_SESSIONS", "false").lower() == "true"
+# QoS: step decoding quality down when a session risks falling behind real time
+QOS_ENABLED = os.environ.get("QOS_ENABLED", "true").lower() == "true"
+# Smaller model for the lowest tier (e.g. "medium" next to large-v3); empty = no model tier
+QOS_FALLBACK_MODEL = os.environ.get("QOS_FALLBACK_MODEL", "")
+# Window load = (decode queue wait + decode time) / new audio per window. 1.0 = exactly real time.
+QOS_HIGH_LOAD = float(os.environ.get("QOS_HIGH_LOAD", "0.8"))
+QOS_LOW_LOAD = float(os.environ.get("QOS_LOW_LOAD", "0.4"))
+# Calm windows in a row before stepping back up one tier
+QOS_RECOVER_WINDOWS = int(os.environ.get("QOS_RECOVER_WINDOWS", "3"))
+
+# Admission control: global session cap derived from measured decode capacity
+ADMISSION_ENABLED = os.environ.get("ADMISSION_ENABLED", "true").lower() == "true"
+# Session budget (per inference worker) until the first full-quality window has been measured
+ADMISSION_INITIAL_CAPACITY = float(os.environ.get("ADMISSION_INITIAL_CAPACITY", "8"))
+# Hard cap on concurrent sessions (0 = capacity-based only)
+MAX_SESSIONS = int(os.environ.get("MAX_SESSIONS", "0"))
+# Share of the decode pool handed out to live windows (headroom for final/diarize decodes)
+ADMISSION_TARGET_UTIL = float(os.environ.get("ADMISSION_TARGET_UTIL", "0.8"))
+# A diarized session counts as this many plain ones (word timestamps + pyannote at STOP)
+ADMISSION_DIARIZE_WEIGHT = float(os.environ.get("ADMISSION_DIARIZE_WEIGHT", "1.5"))
+# Class admitted first from the waiting queue: "diarize" or "plain"
+ADMISSION_PRIORITY = os.environ.get("ADMISSION_PRIORITY", "diarize").lower()
+if ADMISSION_PRIORITY not in ("diarize", "plain"):
+    raise ValueError(f"ADMISSION_PRIORITY must be \"diarize\" or \"plain\", got {ADMISSION_PRIORITY!r}")
+ADMISSION_QUEUE_SIZE = int(os.environ.get("ADMISSION_QUEUE_SIZE", "20"))
+ADMISSION_QUEUE_TIMEOUT_SEC = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT_SEC", "300"))
+ADMISSION_RETRY_AFTER_SEC = int(os.environ.get("ADMISSION_RETRY_AFTER_SEC", "30"))
+
+# Decoding tiers, best first. Each step down trades accuracy for decode time.
+QOS_TIERS = [
+    {"name": "full", "beam_size": WHISPER_BEAM_SIZE, "condition_on_previous_text": True, "prompt_tail": 300, "fallback_model": False},
+    {"name": "reduced", "beam_size": min(2, WHISPER_BEAM_SIZE), "condition_on_previous_text": True, "prompt_tail": 120, "fallback_model": False},
+    {"name": "greedy", "beam_size": 1, "condition_on_previous_text": False, "prompt_tail": 0, "fallback_model": False},
+]
+if QOS_FALLBACK_MODEL:
+    QOS_TIERS.append(
+        {"name": "small_model", "beam_size": 1, "condition_on_previous_text": False, "prompt_tail": 0, "fallback_model": True}
+    )
 
 # ── Per-IP connection tracking ───────────────────────────────────────
 from collections import defaultdict
@@ -63,6 +148,20 @@ import time
 ip_connections: dict[str, int] = defaultdict(int)
 
 
+# ── websockets API compatibility (legacy ≤13 and the new asyncio API ≥14) ──
+
+def socket_closed(websocket) -> bool:
+    return websocket.state in (State.CLOSING, State.CLOSED)
+
+
+def request_path(websocket) -> str:
+    """Path + query of the upgrade request (legacy: .path, new API: .request.path)."""
+    request = getattr(websocket, "request", None)
+    if request is not None:
+        return request.path
+    return getattr(websocket, "path", "") or ""
+
+
 def verify_hmac_token(token: str) -> tuple[bool, str]:
     """Verify HMAC-SHA256 signed token. Returns (is_valid, error_message)."""
     if not WS_TOKEN_SECRET:
@@ -97,42 +196,505 @@ def verify_hmac_token(token: str) -> tuple[bool, str]:
     except Exception as e:
         return False, f"Token verification failed: {e}"
 
-# ── Load models ──────────────────────────────────────────────────────
+# ── Metrics (Prometheus, served on GET /metrics) ─────────────────────
+# No IPs or transcript content in labels — zero-retention applies to metrics too.
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 12, 20, 40, 80, 160)
+RTF_BUCKETS = (0.02, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 4.0)
 
-logger.info(f"Loading Whisper model: {WHISPER_MODEL} on {WHISPER_DEVICE}...")
-whisper_model = WhisperModel(
-    WHISPER_MODEL,
-    device=WHISPER_DEVICE,
-    compute_type=WHISPER_COMPUTE,
+DECODE_SECONDS = Histogram(
+    "whisper_decode_seconds", "Inference time per decode call", ["stage"], buckets=LATENCY_BUCKETS,
 )
-logger.info("Whisper model loaded!")
+DECODE_QUEUE_WAIT_SECONDS = Histogram(
+    "whisper_decode_queue_wait_seconds", "Time a decode waited for a free decode worker", ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+DECODE_RTF = Histogram(
+    "whisper_decode_rtf", "Real-time factor (decode seconds / audio seconds)", ["stage"], buckets=RTF_BUCKETS,
+)
+DIARIZE_SECONDS = Histogram(
+    "whisper_diarize_seconds", "pyannote diarization time per call", buckets=LATENCY_BUCKETS,
+)
+WINDOWS_TOTAL = Counter(
+    "whisper_windows_total", "Live windows by outcome (no_speech = VAD/decoder produced nothing)", ["outcome"],
+)
+AUDIO_SECONDS_TOTAL = Counter("whisper_audio_seconds_total", "Audio received over WebSocket (seconds)")
+INGRESS_BYTES_TOTAL = Counter(
+    "whisper_ingress_bytes_total", "Audio bytes received over WebSocket, before decoding", ["codec"],
+)
+OPUS_FRAMES_TOTAL = Counter("whisper_opus_frames_total", "Opus frames by outcome", ["outcome"])
+SESSIONS_TOTAL = Counter("whisper_sessions_total", "WebSocket sessions by admission result", ["result"])
+SESSION_SECONDS = Histogram(
+    "whisper_session_seconds", "WebSocket session duration", buckets=(10, 30, 60, 300, 900, 1800, 3600, 7200),
+)
+HTTP_REQUESTS_TOTAL = Counter("whisper_http_requests_total", "HTTP requests", ["path", "code"])
+ACTIVE_SESSIONS = Gauge("whisper_active_sessions", "Open WebSocket sessions")
+ACTIVE_SESSIONS.set_function(lambda: sum(list(ip_connections.values())))  # list(): read from the HTTP thread
+ACTIVE_IPS = Gauge("whisper_active_client_ips", "Distinct client IPs with open sessions")
+ACTIVE_IPS.set_function(lambda: len(ip_connections))
+MAX_SESSIONS_PER_IP = Gauge("whisper_max_sessions_per_ip", "Highest session count held by a single IP")
+MAX_SESSIONS_PER_IP.set_function(lambda: max(list(ip_connections.values()), default=0))
+# client_id → bytes held in audio_buffer + all_audio_for_diarize
+session_buffer_bytes: dict[int, int] = {}
+BUFFERED_AUDIO_BYTES = Gauge("whisper_buffered_audio_bytes", "PCM bytes held in session buffers")
+BUFFERED_AUDIO_BYTES.set_function(lambda: sum(list(session_buffer_bytes.values())))
+DECODES_IN_FLIGHT = Gauge("whisper_decodes_in_flight", "Decodes queued or running on the decode pool")
+QOS_WINDOWS_TOTAL = Counter("whisper_qos_windows_total", "Live windows by decoding tier", ["tier"])
+QOS_TIER_CHANGES_TOTAL = Counter("whisper_qos_tier_changes_total", "QoS tier steps", ["direction"])
+WINDOW_BACKLOG = Histogram(
+    "whisper_window_backlog", "Windows waiting in a session's queue when one is picked up",
+    buckets=(0, 1, 2, 3, 5, 8),
+)
+decodes_in_flight = 0
+# Inference worker processes (supervisor mode) — created by load_models() when INFERENCE_WORKERS is set
+worker_pool = None
+
+decode_executor = ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix="decode")
+
 
-logger.info("Loading Silero-VAD...")
-vad_model, vad_utils = torch.hub.load(
-    repo_or_dir="snakers4/silero-vad",
-    model="silero_vad",
-    onnx=True,
+def trace(client_id, stage: str, **fields):
+    """Per-session trace span (TRACE_SESSIONS=true). Timings only."""
+    if TRACE_SESSIONS:
+        details = " ".join(f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}" for k, v in fields.items())
+        logger.info(f"[{client_id}] span {stage} {details}")
+
+
+async def run_decode(client_id, stage: str, fn, audio_float32: np.ndarray, *args):
+    """
+    Run a blocking decode on the decode pool, recording queue wait, decode time and RTF.
+    Returns (result, queue_wait_sec, decode_sec).
+    """
+    global decodes_in_flight
+    submitted = time.monotonic()
+    started = submitted
+
+    def timed():
+        nonlocal started
+        started = time.monotonic()
+        return fn(audio_float32, *args)
+
+    DECODES_IN_FLIGHT.inc()
+    decodes_in_flight += 1
+    try:
+        if worker_pool is not None:
+            # Supervisor mode: decode on the session's inference worker (audio via shared memory)
+            result, _, decode_sec = await asyncio.wrap_future(
+                worker_pool.submit(client_id, fn.__name__, audio_float32, args)
+            )
+            started = time.monotonic() - decode_sec
+        else:
+            result = await asyncio.get_running_loop().run_in_executor(decode_executor, timed)
+    finally:
+        DECODES_IN_FLIGHT.dec()
+        decodes_in_flight -= 1
+    finished = time.monotonic()
+
+    audio_sec = len(audio_float32) / SAMPLE_RATE
+    # Supervisor mode: queue wait includes the handoff to the worker process
+    queue_wait = started - submitted
+    decode_sec = finished - started
+    rtf = decode_sec / audio_sec if audio_sec > 0 else 0.0
+    DECODE_QUEUE_WAIT_SECONDS.labels(stage).observe(queue_wait)
+    DECODE_SECONDS.labels(stage).observe(decode_sec)
+    DECODE_RTF.labels(stage).observe(rtf)
+    trace(client_id, stage, audio=audio_sec, queue_wait=queue_wait, decode=decode_sec, rtf=rtf)
+    return result, queue_wait, decode_sec
+
+
+def decode_blocking(fn, audio_float32: np.ndarray, *args):
+    """Synchronous decode for the HTTP thread: in-process, or on an inference worker in supervisor mode."""
+    if worker_pool is None:
+        return fn(audio_float32, *args)
+    result, _, _ = worker_pool.submit(None, fn.__name__, audio_float32, args).result()
+    return result
+
+
+def decode_slots() -> int:
+    """Decodes that can run at once: decode threads × live inference workers."""
+    if worker_pool is None:
+        return DECODE_WORKERS
+    return DECODE_WORKERS * max(1, worker_pool.ready_count())
+
+
+# ── QoS controller ───────────────────────────────────────────────────
+
+class QosController:
+    """
+    Per-session decoding tier. Steps down one tier per window while the session
+    is behind (queued windows) or its window load — measured, or projected from
+    the decode pool's queue depth — is above QOS_HIGH_LOAD; steps back up after
+    QOS_RECOVER_WINDOWS calm windows.
+    """
+
+    def __init__(self, client_id):
+        self.client_id = client_id
+        self.level = 0
+        self.load_ema = None
+        self.last_decode_sec = 0.0
+        self.calm_windows = 0
+
+    @property
+    def tier(self) -> dict:
+        return QOS_TIERS[self.level]
+
+    def before_window(self, backlog_windows: int) -> dict:
+        """Pick the tier for the next window."""
+        if not QOS_ENABLED:
+            return self.tier
+        # GPU queue depth: decodes ahead of us per worker, each roughly as long as our last one
+        slots = decode_slots()
+        waiting_per_worker = max(0, decodes_in_flight - slots + 1) / slots
+        projected = (waiting_per_worker + 1) * self.last_decode_sec / (BUFFER_DURATION_SEC - OVERLAP_DURATION_SEC)
+        load = max(self.load_ema or 0.0, projected)
+        if backlog_windows > 0 or load > QOS_HIGH_LOAD:
+            self.calm_windows = 0
+            self._step(+1, f"backlog={backlog_windows} queue/worker={waiting_per_worker:.1f} load={load:.2f}")
+        elif load < QOS_LOW_LOAD:
+            self.calm_windows += 1
+            if self.calm_windows >= QOS_RECOVER_WINDOWS:
+                self.calm_windows = 0
+                self._step(-1, f"load={load:.2f}")
+        else:
+            self.calm_windows = 0
+        return self.tier
+
+    def after_window(self, queue_wait: float, decode_sec: float):
+        self.last_decode_sec = decode_sec
+        load = (queue_wait + decode_sec) / (BUFFER_DURATION_SEC - OVERLAP_DURATION_SEC)
+        self.load_ema = load if self.load_ema is None else 0.5 * load + 0.5 * self.load_ema
+
+    def _step(self, direction: int, reason: str):
+        level = min(max(self.level + direction, 0), len(QOS_TIERS) - 1)
+        if level == self.level:
+            return
+        if QOS_TIERS[level]["fallback_model"] and model_status["qos_model"] != "ready":
+            return  # model tier not loaded (yet)
+        self.level = level
+        QOS_TIER_CHANGES_TOTAL.labels("down" if direction > 0 else "up").inc()
+        # Tier changes invalidate the load estimate, which was measured at the old tier
+        self.load_ema = None
+        logger.info(f"[{self.client_id}] QoS tier → {self.tier['name']} ({reason})")
+
+
+# ── Admission control ────────────────────────────────────────────────
+
+class AdmissionController:
+    """
+    Global admission. Sessions are admitted while their summed weight fits the
+    decode capacity: decode slots (threads × inference workers) × ADMISSION_TARGET_UTIL
+    / per-session decode load, measured on full-tier windows (so QoS step-downs
+    don't inflate capacity).
+    Others wait in a bounded queue ordered by (priority class, arrival).
+    """
+
+    def __init__(self):
+        self.active: dict[int, float] = {}  # client_id → weight
+        self.queue: list[dict] = []  # waiters, admission order
+        self.session_load = None  # EMA: share of one decode worker a plain live session uses
+
+    def capacity(self) -> float:
+        if not self.session_load:
+            capacity = ADMISSION_INITIAL_CAPACITY * decode_slots() / DECODE_WORKERS
+        else:
+            capacity = decode_slots() * ADMISSION_TARGET_UTIL / self.session_load
+        return min(capacity, MAX_SESSIONS) if MAX_SESSIONS > 0 else capacity
+
+    def load(self) -> float:
+        return sum(list(self.active.values()))  # list(): also read from the HTTP thread
+
+    def observe_window(self, decode_sec: float):
+        load = decode_sec / (BUFFER_DURATION_SEC - OVERLAP_DURATION_SEC)
+        # Slow EMA — capacity should track the hardware, not single windows
+        self.session_load = load if self.session_load is None else 0.2 * load + 0.8 * self.session_load
+        self._pump()
+
+    def _fits(self, weight: float) -> bool:
+        return not self.active or self.load() + weight <= self.capacity()
+
+    def _pump(self):
+        """Admit from the queue head while sessions fit (strict order — heavy sessions don't starve)."""
+        while self.queue and self._fits(self.queue[0]["weight"]):
+            waiter = self.queue.pop(0)
+            self.active[waiter["client_id"]] = waiter["weight"]
+            if not waiter["future"].done():
+                waiter["future"].set_result(True)
+
+    def _leave_queue(self, waiter: dict):
+        if waiter in self.queue:
+            self.queue.remove(waiter)
+        elif waiter["future"].done() and waiter["future"].result():
+            self.release(waiter["client_id"])  # admitted in the same tick it gave up
+
+    async def acquire(self, websocket, client_id, diarize: bool) -> str:
+        """Returns "admitted", "busy" (queue full) or "timeout"."""
+        weight = ADMISSION_DIARIZE_WEIGHT if diarize else 1.0
+        if not ADMISSION_ENABLED:
+            self.active[client_id] = weight
+            return "admitted"
+
+        priority = 0 if diarize == (ADMISSION_PRIORITY == "diarize") else 1
+        waiter = {
+            "client_id": client_id,
+            "weight": weight,
+            "priority": priority,
+            "future": asyncio.get_running_loop().create_future(),
+        }
+        # Behind everyone of the same or higher priority
+        index = next((i for i, w in enumerate(self.queue) if w["priority"] > priority), len(self.queue))
+        self.queue.insert(index, waiter)
+        self._pump()
+        if waiter["future"].done():
+            return "admitted"
+        if len(self.queue) > ADMISSION_QUEUE_SIZE:
+            # Full: drop the lowest-priority, newest waiter (the queue tail) — the newcomer
+            # itself unless it outranks someone already waiting
+            evicted = self.queue.pop()
+            if evicted is waiter:
+                return "busy"
+            evicted["future"].set_result(False)
+            logger.info(f"[{evicted['client_id']}] Evicted from the full queue by a higher-priority session")
+
+        SESSIONS_TOTAL.labels("queued").inc()
+        logger.info(f"[{client_id}] Queued for admission (load {self.load():.1f}/{self.capacity():.1f})")
+        start = time.monotonic()
+        last_position = None
+        try:
+            while not waiter["future"].done():
+                if socket_closed(websocket):
+                    raise websockets.exceptions.ConnectionClosed(None, None)
+                position = self.queue.index(waiter) + 1
+                if position != last_position:
+                    await websocket.send(json.dumps({"status": "queued", "position": position}))
+                    last_position = position
+                remaining = ADMISSION_QUEUE_TIMEOUT_SEC - (time.monotonic() - start)
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(asyncio.shield(waiter["future"]), timeout=min(1.0, remaining))
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            self._leave_queue(waiter)
+            raise
+        ADMISSION_WAIT_SECONDS.observe(time.monotonic() - start)
+        if not waiter["future"].done():
+            self._leave_queue(waiter)
+            return "timeout"
+        if not waiter["future"].result():
+            return "busy"  # evicted by a higher-priority arrival
+        try:
+            await websocket.send(json.dumps({"status": "admitted"}))
+        except BaseException:
+            # _pump already counted this session — a client that left while queued must not keep its slot
+            self.release(client_id)
+            raise
+        return "admitted"
+
+    def reweight(self, client_id, diarize: bool):
+        if client_id in self.active:
+            self.active[client_id] = ADMISSION_DIARIZE_WEIGHT if diarize else 1.0
+
+    def release(self, client_id):
+        self.active.pop(client_id, None)
+        self._pump()
+
+    def status(self) -> dict:
+        return {
+            "active": len(self.active),
+            "load": round(self.load(), 2),
+            "capacity": round(self.capacity(), 2),
+            "queued": len(self.queue),
+        }
+
+
+admission = AdmissionController()
+ADMISSION_CAPACITY = Gauge("whisper_admission_capacity", "Session capacity (plain-session units)")
+ADMISSION_CAPACITY.set_function(admission.capacity)
+ADMISSION_LOAD = Gauge("whisper_admission_load", "Admitted session weight (plain-session units)")
+ADMISSION_LOAD.set_function(admission.load)
+ADMISSION_QUEUE_LENGTH = Gauge("whisper_admission_queue_length", "Sessions waiting for admission")
+ADMISSION_QUEUE_LENGTH.set_function(lambda: len(admission.queue))
+ADMISSION_WAIT_SECONDS = Histogram(
+    "whisper_admission_wait_seconds", "Time queued sessions waited", buckets=(1, 5, 15, 30, 60, 120, 300),
 )
-(get_speech_timestamps, _, _, _, _) = vad_utils
-logger.info("Silero-VAD loaded!")
 
-# Load pyannote diarization pipeline (optional — requires HF_TOKEN)
+
+# ── Load models (background, after the ports are bound) ──────────────
+
+whisper_model = None
+qos_model = None  # QOS_FALLBACK_MODEL, used by the lowest QoS tier
+vad_model = None
+get_speech_timestamps = None
 diarize_pipeline = None
-if HF_TOKEN:
+# "loading" | "ready" | "failed" | "disabled" — reported by GET /health
+model_status = {
+    "whisper": "loading",
+    "vad": "loading",
+    "diarize": "loading" if HF_TOKEN else "disabled",
+    "qos_model": "loading" if QOS_FALLBACK_MODEL else "disabled",
+}
+load_error = ""
+# Set once Whisper + VAD finished loading (successfully or not — check load_error)
+models_ready = asyncio.Event()
+# Set once the optional pyannote pipeline finished loading
+diarize_ready = asyncio.Event()
+
+
+def load_whisper():
+    global whisper_model
+    from faster_whisper import WhisperModel
+    models = [WHISPER_MODEL] + ([WHISPER_FALLBACK_MODEL] if WHISPER_FALLBACK_MODEL else [])
+    for i, name in enumerate(models):
+        logger.info(f"Loading Whisper model: {name} on {WHISPER_DEVICE} ({WHISPER_COMPUTE}, profile {WHISPER_PROFILE})...")
+        try:
+            whisper_model = WhisperModel(
+                name,
+                device=WHISPER_DEVICE,
+                compute_type=WHISPER_COMPUTE,
+                # num_workers lets DECODE_WORKERS threads run transcribe() in parallel
+                num_workers=DECODE_WORKERS,
+                cpu_threads=WHISPER_CPU_THREADS if WHISPER_DEVICE == "cpu" else 0,
+            )
+        except Exception as e:
+            if i == len(models) - 1:
+                raise
+            logger.warning(f"Failed to load {name}: {e}. Falling back to {models[i + 1]}")
+            continue
+        logger.info(f"Whisper model loaded! ({name}, {DECODE_WORKERS} decode workers)")
+        return
+
+
+def load_qos_model():
+    """Smaller Whisper for the lowest QoS tier (optional — QOS_FALLBACK_MODEL)."""
+    global qos_model
+    if not QOS_FALLBACK_MODEL:
+        return
+    try:
+        from faster_whisper import WhisperModel
+        logger.info(f"Loading QoS fallback model: {QOS_FALLBACK_MODEL}...")
+        qos_model = WhisperModel(
+            QOS_FALLBACK_MODEL,
+            device=WHISPER_DEVICE,
+            compute_type=WHISPER_COMPUTE,
+            num_workers=DECODE_WORKERS,
+            cpu_threads=WHISPER_CPU_THREADS if WHISPER_DEVICE == "cpu" else 0,
+        )
+        model_status["qos_model"] = "ready"
+        logger.info("QoS fallback model loaded!")
+    except Exception as e:
+        model_status["qos_model"] = "failed"
+        logger.warning(f"Failed to load QoS fallback model: {e}. Lowest tier disabled.")
+
+
+def load_vad():
+    global vad_model, get_speech_timestamps
+    import torch
+    if os.path.isdir(SILERO_VAD_DIR):
+        logger.info(f"Loading Silero-VAD from {SILERO_VAD_DIR}...")
+        vad_model, vad_utils = torch.hub.load(
+            repo_or_dir=SILERO_VAD_DIR,
+            model="silero_vad",
+            source="local",
+            onnx=True,
+        )
+    else:
+        logger.warning(f"{SILERO_VAD_DIR} not found — loading Silero-VAD from torch.hub (network)")
+        vad_model, vad_utils = torch.hub.load(
+            repo_or_dir="snakers4/silero-vad",
+            model="silero_vad",
+            onnx=True,
+        )
+    (get_speech_timestamps, _, _, _, _) = vad_utils
+    logger.info("Silero-VAD loaded!")
+
+
+def load_diarize():
+    """Load pyannote diarization pipeline (optional — requires HF_TOKEN)."""
+    global diarize_pipeline
+    if not HF_TOKEN:
+        logger.info("HF_TOKEN not set — diarization disabled.")
+        return
     try:
+        import torch
         from pyannote.audio import Pipeline
         logger.info("Loading pyannote diarization pipeline...")
-        diarize_pipeline = Pipeline.from_pretrained(
+        pipeline = Pipeline.from_pretrained(
             "pyannote/speaker-diarization-3.1",
             use_auth_token=HF_TOKEN,
         )
         if torch.cuda.is_available():
-            diarize_pipeline.to(torch.device("cuda"))
+            pipeline.to(torch.device("cuda"))
+        diarize_pipeline = pipeline
+        model_status["diarize"] = "ready"
         logger.info("pyannote diarization pipeline loaded!")
     except Exception as e:
+        model_status["diarize"] = "failed"
         logger.warning(f"Failed to load pyannote pipeline: {e}. Diarization disabled.")
-else:
-    logger.info("HF_TOKEN not set — diarization disabled.")
+
+
+async def load_model(name: str, loader):
+    global load_error
+    try:
+        await asyncio.to_thread(loader)
+        model_status[name] = "ready"
+    except Exception as e:
+        model_status[name] = "failed"
+        load_error = f"{name}: {e}"
+        logger.error(f"Failed to load {name}: {e}")
+
+
+async def load_models():
+    """Load all models concurrently; sessions are admitted as soon as Whisper + VAD are up."""
+    global worker_pool
+    start = time.monotonic()
+    devices = resolve_worker_devices() if INFERENCE_WORKERS else []
+    if devices:
+        # Supervisor mode: Whisper, pyannote and the QoS model load inside the inference workers
+        logger.info(f"Supervisor mode: {len(devices)} inference workers on GPUs {','.join(devices)}")
+        worker_pool = InferenceWorkerPool(devices, setup=worker_setup)
+        whisper_loader = worker_pool.start
+        diarize_task = asyncio.create_task(asyncio.to_thread(worker_pool.wait_optional_models))
+    else:
+        whisper_loader = load_whisper
+        diarize_task = asyncio.create_task(asyncio.to_thread(load_diarize))
+    await asyncio.gather(load_model("whisper", whisper_loader), load_model("vad", load_vad))
+    models_ready.set()
+    if not load_error:
+        logger.info(f"Models ready in {time.monotonic() - start:.1f}s")
+    # Optional models don't gate readiness
+    if worker_pool is not None:
+        await diarize_task
+    else:
+        await asyncio.gather(diarize_task, asyncio.to_thread(load_qos_model))
+    diarize_ready.set()
+
+
+def models_available() -> bool:
+    return models_ready.is_set() and not load_error
+
+
+async def wait_for_models(websocket, client_id) -> bool:
+    """Hold a session that connected during startup until models are ready. False = deferred."""
+    if models_available():
+        return True
+    if not models_ready.is_set():
+        await websocket.send(json.dumps({"status": "loading"}))
+        logger.info(f"[{client_id}] Waiting for models to load...")
+        try:
+            await asyncio.wait_for(models_ready.wait(), timeout=MODEL_WAIT_TIMEOUT_SEC)
+        except asyncio.TimeoutError:
+            pass
+    if models_available():
+        await websocket.send(json.dumps({"status": "ready"}))
+        return True
+    logger.warning(f"[{client_id}] Models not available, deferring session")
+    await websocket.send(json.dumps({
+        "error": "Models loading, retry later",
+        "code": 503,
+        "retry_after": MODEL_RETRY_AFTER_SEC,
+    }))
+    await websocket.close(4503, "Models not ready")
+    return False
 
 
 def int16_to_float32(audio_bytes: bytes) -> np.ndarray:
@@ -144,6 +706,7 @@ def int16_to_float32(audio_bytes: bytes) -> np.ndarray:
 
 def has_speech(audio_float32: np.ndarray) -> bool:
     """Check if audio contains speech using Silero-VAD."""
+    import torch
     if len(audio_float32) < 512:
         return False
     tensor = torch.from_numpy(audio_float32)
@@ -151,21 +714,23 @@ def has_speech(audio_float32: np.ndarray) -> bool:
     return len(timestamps) > 0
 
 
-def transcribe(audio_float32: np.ndarray, previous_text: str = "") -> str:
+def transcribe(audio_float32: np.ndarray, previous_text: str = "", tier: dict = None) -> str:
     """Transcribe audio using Faster-Whisper. Zero-retention: audio stays in RAM only."""
+    tier = tier or QOS_TIERS[0]
     # Better initial_prompt: hints Whisper to produce proper punctuation and capitalization
     prompt = "Transkrypcja profesjonalnej rozmowy po polsku. Mówca używa poprawnej polszczyzny, terminologii branżowej. Interpunkcja i wielkie litery."
-    if previous_text:
-        tail = previous_text[-300:].strip()
+    if previous_text and tier["prompt_tail"]:
+        tail = previous_text[-tier["prompt_tail"]:].strip()
         prompt = f"{prompt} {tail}"
 
-    segments, _ = whisper_model.transcribe(
+    model = qos_model if tier["fallback_model"] and qos_model is not None else whisper_model
+    segments, _ = model.transcribe(
         audio_float32,
         language="pl",
         initial_prompt=prompt,
         temperature=0.0,
-        beam_size=5,
-        condition_on_previous_text=True,
+        beam_size=tier["beam_size"],
+        condition_on_previous_text=tier["condition_on_previous_text"],
         vad_filter=True,
         vad_parameters=dict(
             threshold=VAD_THRESHOLD,
@@ -178,6 +743,93 @@ def transcribe(audio_float32: np.ndarray, previous_text: str = "") -> str:
     return text.strip()
 
 
+# ── Opus transport ───────────────────────────────────────────────────
+
+# Longest Opus packet (120 ms) at the decode rate
+OPUS_MAX_FRAME_SAMPLES = SAMPLE_RATE * 120 // 1000
+
+
+class OpusStream:
+    """
+    Incremental Opus → 16kHz Int16 PCM for one session. Each binary message is a
+    2-byte big-endian sequence number followed by one Opus packet. Gaps (frames
+    the client dropped under backpressure) are concealed: PLC, then in-band FEC
+    from the next packet for the frame right before it. Late or duplicate
+    packets are dropped; a corrupt packet is concealed like a lost one.
+    """
+
+    def __init__(self):
+        import opuslib  # optional: only needed once a client negotiates Opus
+        self._error = opuslib.OpusError
+        self.decoder = opuslib.Decoder(SAMPLE_RATE, 1)
+        self.next_seq = None
+        self.frame_samples = SAMPLE_RATE // 50  # 20 ms until the first packet says otherwise
+
+    def decode(self, message: bytes) -> bytes:
+        if len(message) < 3:
+            OPUS_FRAMES_TOTAL.labels("corrupt").inc()
+            return b""
+        seq = int.from_bytes(message[:2], "big")
+        packet = message[2:]
+        pcm = bytearray()
+        if self.next_seq is not None:
+            gap = (seq - self.next_seq) & 0xFFFF
+            if gap >= 0x8000:
+                OPUS_FRAMES_TOTAL.labels("late").inc()  # its slot was already concealed
+                return b""
+            if gap:
+                pcm += self._conceal(packet, gap)
+        self.next_seq = (seq + 1) & 0xFFFF
+        try:
+            frame = self.decoder.decode(packet, OPUS_MAX_FRAME_SAMPLES)
+        except self._error:
+            OPUS_FRAMES_TOTAL.labels("corrupt").inc()
+            return bytes(pcm + self._plc())
+        self.frame_samples = len(frame) // 2
+        OPUS_FRAMES_TOTAL.labels("decoded").inc()
+        return bytes(pcm + frame)
+
+    def _conceal(self, packet: bytes, gap: int) -> bytes:
+        if gap > OPUS_MAX_CONCEAL_FRAMES:
+            # Long dropout: smooth the edge with a few PLC frames, don't invent seconds of audio
+            OPUS_FRAMES_TOTAL.labels("skipped").inc(gap - OPUS_MAX_CONCEAL_FRAMES)
+            return b"".join(self._plc() for _ in range(OPUS_MAX_CONCEAL_FRAMES))
+        pcm = b"".join(self._plc() for _ in range(gap - 1))
+        try:
+            # Packet's LBRR data rebuilds the previous frame (libopus falls back to PLC without it)
+            pcm += self.decoder.decode(packet, self.frame_samples, decode_fec=True)
+            OPUS_FRAMES_TOTAL.labels("fec").inc()
+        except self._error:
+            pcm += self._plc()
+        return pcm
+
+    def _plc(self) -> bytes:
+        OPUS_FRAMES_TOTAL.labels("plc").inc()
+        return self.decoder.decode(b"", self.frame_samples)
+
+
+async def negotiate_codec(websocket, client_id, name) -> tuple[bool, "OpusStream | None"]:
+    """
+    Switch a session's audio codec. Returns (accepted, decoder — None for raw PCM).
+    Unknown or unavailable codecs get 415 and the session is closed.
+    """
+    name = str(name).lower()
+    stream = None
+    if name == "opus":
+        try:
+            stream = OpusStream()
+        except Exception as e:  # opuslib raises a bare Exception when libopus is missing
+            logger.error(f"[{client_id}] Opus requested but unavailable: {e}")
+            name = ""
+    if name not in ("pcm", "opus"):
+        await websocket.send(json.dumps({"error": "Unsupported codec", "code": 415}))
+        await websocket.close(4415, "Unsupported codec")
+        return False, None
+    logger.info(f"[{client_id}] Audio codec: {name}")
+    await websocket.send(json.dumps({"status": "codec_enabled", "codec": name}))
+    return True, stream
+
+
 # ── Hallucination filter ─────────────────────────────────────────────
 HALLUCINATION_PATTERNS = [
     "wszelkie prawa zastrzeżone",
@@ -242,10 +894,12 @@ def diarize(audio_float32: np.ndarray) -> list:
         return []
     
     import soundfile as sf
+    start = time.monotonic()
     # pyannote needs a file-like object or path
     with tempfile.NamedTemporaryFile(suffix=".wav", delete=True) as tmp:
         sf.write(tmp.name, audio_float32, SAMPLE_RATE)
         diarization = diarize_pipeline(tmp.name)
+    DIARIZE_SECONDS.observe(time.monotonic() - start)
     
     segments = []
     for turn, _, speaker in diarization.itertracks(yield_label=True):
@@ -273,7 +927,7 @@ def transcribe_with_speakers(audio_float32: np.ndarray, previous_text: str = "")
         language="pl",
         initial_prompt=prompt,
         temperature=0.0,
-        beam_size=5,
+        beam_size=WHISPER_BEAM_SIZE,
         condition_on_previous_text=True,
         word_timestamps=True,
         vad_filter=True,
@@ -343,6 +997,311 @@ def transcribe_with_speakers(audio_float32: np.ndarray, previous_text: str = "")
     return "\n".join(result_parts)
 
 
+# ── Inference workers (supervisor mode) ──────────────────────────────
+
+import itertools
+import multiprocessing
+import queue
+import subprocess
+import sys
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+
+# Decode functions a worker runs on behalf of the supervisor (looked up by name)
+WORKER_FUNCTIONS = ("transcribe", "transcribe_with_speakers")
+# Called with this module in each worker before its models load (hook for the bench stub backend)
+worker_setup = None
+
+WORKER_UP = Gauge("whisper_worker_up", "Inference worker ready (1) or not (0)", ["worker"])
+WORKER_SESSIONS = Gauge("whisper_worker_sessions", "Sessions pinned to an inference worker", ["worker"])
+WORKER_IN_FLIGHT = Gauge("whisper_worker_decodes_in_flight", "Decodes handed to an inference worker", ["worker"])
+WORKER_RESTARTS_TOTAL = Counter("whisper_worker_restarts_total", "Inference workers restarted after dying", ["worker"])
+
+
+def resolve_worker_devices() -> list[str]:
+    """INFERENCE_WORKERS → one CUDA device index per worker process ([] = single process)."""
+    if INFERENCE_WORKERS.lower() != "auto":
+        return [d.strip() for d in INFERENCE_WORKERS.split(",") if d.strip()]
+    visible = os.environ.get("CUDA_VISIBLE_DEVICES", "").strip()
+    if visible:
+        # Workers overwrite CUDA_VISIBLE_DEVICES, so hand each one an entry of ours
+        return [d.strip() for d in visible.split(",") if d.strip()]
+    try:
+        out = subprocess.run(["nvidia-smi", "-L"], capture_output=True, text=True, timeout=10).stdout
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.warning(f"INFERENCE_WORKERS=auto: nvidia-smi failed ({e}), running single-process")
+        return []
+    return [str(i) for i, line in enumerate(l for l in out.splitlines() if l.startswith("GPU "))]
+
+
+def worker_main(worker_id: int, device: str, requests, responses, setup=None):
+    """Inference worker process: loads the models on one GPU and serves decode jobs from the supervisor."""
+    # Before anything touches CUDA — the worker sees its GPU as cuda:0
+    os.environ["CUDA_VISIBLE_DEVICES"] = device
+    if setup is not None:
+        setup(sys.modules[__name__])
+    try:
+        load_whisper()
+    except Exception as e:
+        responses.put(("failed", worker_id, f"whisper: {e}"))
+        return
+    responses.put(("ready", worker_id))
+
+    def load_optional_models():
+        load_diarize()
+        load_qos_model()
+        responses.put(("models", worker_id, {
+            "diarize": model_status["diarize"],
+            "qos_model": model_status["qos_model"],
+        }))
+
+    def run_job(job_id, fn_name, shm_name, n_samples, args, received):
+        try:
+            if fn_name not in WORKER_FUNCTIONS:
+                raise ValueError(f"{fn_name} is not a worker function")
+            shm = shared_memory.SharedMemory(name=shm_name)
+            try:
+                # Private copy: the supervisor unlinks the segment as soon as the result is back
+                audio = np.ndarray((n_samples,), dtype=np.float32, buffer=shm.buf).copy()
+            finally:
+                shm.close()
+            started = time.monotonic()
+            result = globals()[fn_name](audio, *args)
+            del audio
+            responses.put(("result", job_id, result, started - received, time.monotonic() - started))
+        except Exception as e:
+            responses.put(("error", job_id, f"{type(e).__name__}: {e}"))
+
+    threading.Thread(target=load_optional_models, daemon=True).start()
+    executor = ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix="decode")
+    while True:
+        job = requests.get()
+        if job is None:
+            break
+        executor.submit(run_job, *job, time.monotonic())
+    executor.shutdown(wait=True)
+
+
+class InferenceWorkerPool:
+    """
+    Supervisor side of INFERENCE_WORKERS: one spawned process per device, each
+    with its own models. Sessions are pinned to the least-loaded live worker at
+    admission; audio goes over shared memory, results come back on one response
+    queue. A worker that dies is restarted and its sessions re-routed on their
+    next decode. Per-IP limits, admission and metrics stay in this process.
+    """
+
+    def __init__(self, devices: list[str], setup=None):
+        # spawn: fresh interpreter per worker, no inherited CUDA context
+        self.ctx = multiprocessing.get_context("spawn")
+        self.setup = setup
+        self.responses = self.ctx.Queue()
+        self.workers = [
+            {
+                "id": i,
+                "device": device,
+                "process": None,
+                "requests": None,
+                "state": "loading",  # "loading" | "ready" | "failed"
+                "models": None,  # optional model status, once reported
+                "sessions": set(),
+                "in_flight": 0,
+                "error": "",
+            }
+            for i, device in enumerate(devices)
+        ]
+        self.sessions: dict = {}  # client_id → worker
+        self.jobs: dict = {}  # job_id → (worker, future, shared memory)
+        self.job_ids = itertools.count()
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        for worker in self.workers:
+            label = str(worker["id"])
+            WORKER_UP.labels(label).set_function(lambda w=worker: 1 if w["state"] == "ready" else 0)
+            WORKER_SESSIONS.labels(label).set_function(lambda w=worker: len(w["sessions"]))
+            WORKER_IN_FLIGHT.labels(label).set_function(lambda w=worker: w["in_flight"])
+
+    def start(self):
+        """Spawn all workers and block until each is ready or failed. Raises if none came up."""
+        with self.lock:
+            for worker in self.workers:
+                self._spawn(worker)
+        threading.Thread(target=self._read_responses, daemon=True, name="inference-responses").start()
+        with self.changed:
+            self.changed.wait_for(lambda: all(w["state"] != "loading" for w in self.workers))
+            if not self.ready_count():
+                raise RuntimeError("; ".join(f"worker {w['id']}: {w['error']}" for w in self.workers))
+        logger.info(f"{self.ready_count()}/{len(self.workers)} inference workers ready")
+
+    def wait_optional_models(self):
+        """Block until every live worker has reported pyannote / QoS model status."""
+        with self.changed:
+            self.changed.wait_for(lambda: all(
+                w["state"] == "failed" or (w["state"] == "ready" and w["models"] is not None)
+                for w in self.workers
+            ))
+
+    def ready_count(self) -> int:
+        return sum(1 for w in self.workers if w["state"] == "ready")
+
+    def assign(self, client_id):
+        """Pin a session to the least-loaded live worker (sessions, then decodes in flight)."""
+        with self.lock:
+            return self._route(client_id)
+
+    def release(self, client_id):
+        with self.lock:
+            worker = self.sessions.pop(client_id, None)
+            if worker is not None:
+                worker["sessions"].discard(client_id)
+
+    def submit(self, client_id, fn_name: str, audio_float32: np.ndarray, args) -> Future:
+        """
+        Hand a decode to the session's worker (client_id None = unpinned, e.g. HTTP).
+        The future resolves to (result, worker queue wait, decode seconds).
+        """
+        if fn_name not in WORKER_FUNCTIONS:
+            raise ValueError(f"{fn_name} cannot run on an inference worker")
+        audio = np.ascontiguousarray(audio_float32, dtype=np.float32)
+        # /dev/shm is RAM: zero-retention holds, the segment is unlinked once the result is back
+        shm = shared_memory.SharedMemory(create=True, size=max(1, audio.nbytes))
+        np.ndarray(audio.shape, dtype=np.float32, buffer=shm.buf)[:] = audio
+        future = Future()
+        with self.lock:
+            worker = self._route(client_id)
+            if worker is None:
+                self._release_shm(shm)
+                raise RuntimeError("No inference worker available")
+            job_id = next(self.job_ids)
+            self.jobs[job_id] = (worker, future, shm)
+            worker["in_flight"] += 1
+            worker["requests"].put((job_id, fn_name, shm.name, len(audio), args))
+        return future
+
+    def status(self) -> list[dict]:
+        return [
+            {
+                "worker": w["id"],
+                "gpu": w["device"],
+                "state": w["state"],
+                "sessions": len(w["sessions"]),
+                "in_flight": w["in_flight"],
+            }
+            for w in self.workers
+        ]
+
+    def _spawn(self, worker):
+        worker["requests"] = self.ctx.Queue()
+        worker["state"], worker["models"] = "loading", None
+        worker["process"] = self.ctx.Process(
+            target=worker_main,
+            args=(worker["id"], worker["device"], worker["requests"], self.responses, self.setup),
+            name=f"inference-worker-{worker['id']}",
+            daemon=True,
+        )
+        worker["process"].start()
+        logger.info(f"Inference worker {worker['id']} starting on GPU {worker['device']} (pid {worker['process'].pid})")
+
+    def _route(self, client_id):
+        worker = self.sessions.get(client_id)
+        if worker is not None and worker["state"] == "ready":
+            return worker
+        live = [w for w in self.workers if w["state"] == "ready"]
+        if not live:
+            return None
+        if client_id is None:
+            return min(live, key=lambda w: (w["in_flight"], len(w["sessions"])))
+        worker = min(live, key=lambda w: (len(w["sessions"]), w["in_flight"]))
+        worker["sessions"].add(client_id)
+        self.sessions[client_id] = worker
+        return worker
+
+    def _read_responses(self):
+        last_check = time.monotonic()
+        while True:
+            try:
+                message = self.responses.get(timeout=1.0)
+            except queue.Empty:
+                message = None
+            if time.monotonic() - last_check >= 1.0:
+                self._check_workers()
+                last_check = time.monotonic()
+            if message is None:
+                continue
+
+            kind, key = message[0], message[1]
+            if kind in ("result", "error"):
+                with self.lock:
+                    job = self.jobs.pop(key, None)
+                    if job is None:
+                        continue  # worker died and the job was already failed
+                    worker, future, shm = job
+                    worker["in_flight"] -= 1
+                self._release_shm(shm)
+                if kind == "result":
+                    future.set_result(message[2:])
+                else:
+                    future.set_exception(RuntimeError(f"worker {worker['id']}: {message[2]}"))
+                continue
+
+            with self.changed:
+                worker = self.workers[key]
+                if kind == "ready":
+                    worker["state"] = "ready"
+                    logger.info(f"Inference worker {key} ready on GPU {worker['device']}")
+                elif kind == "models":
+                    worker["models"] = message[2]
+                    self._update_model_status()
+                elif kind == "failed":
+                    worker["state"], worker["error"] = "failed", message[2]
+                    logger.error(f"Inference worker {key} failed to load: {message[2]}")
+                self.changed.notify_all()
+
+    def _check_workers(self):
+        """Fail the decodes of dead workers and restart them (one that dies while loading stays down)."""
+        lost = []
+        with self.changed:
+            for worker in self.workers:
+                if worker["state"] == "failed" or worker["process"].is_alive():
+                    continue
+                exitcode = worker["process"].exitcode
+                for job_id in [j for j, job in self.jobs.items() if job[0] is worker]:
+                    lost.append(self.jobs.pop(job_id))
+                worker["in_flight"] = 0
+                for client_id in worker["sessions"]:
+                    self.sessions.pop(client_id, None)
+                worker["sessions"].clear()
+                if worker["state"] == "loading":
+                    worker["state"] = "failed"
+                    worker["error"] = f"exited with code {exitcode} while loading"
+                    logger.error(f"Inference worker {worker['id']} {worker['error']}")
+                else:
+                    logger.error(f"Inference worker {worker['id']} died (exit code {exitcode}), restarting")
+                    WORKER_RESTARTS_TOTAL.labels(str(worker["id"])).inc()
+                    self._spawn(worker)
+                self._update_model_status()
+                self.changed.notify_all()
+        for worker, future, shm in lost:
+            self._release_shm(shm)
+            future.set_exception(RuntimeError(f"inference worker {worker['id']} died"))
+
+    def _update_model_status(self):
+        """Optional models count as ready if any live worker has them."""
+        reported = [w["models"] for w in self.workers if w["state"] == "ready" and w["models"]]
+        for name in ("diarize", "qos_model"):
+            statuses = [m[name] for m in reported]
+            if statuses:
+                model_status[name] = "ready" if "ready" in statuses else statuses[0]
+
+    @staticmethod
+    def _release_shm(shm):
+        shm.close()
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
 # ── WebSocket handler ────────────────────────────────────────────────
 
 async def handle_client(websocket):
@@ -355,16 +1314,23 @@ async def handle_client(websocket):
     
     if ip_connections[client_ip] > MAX_CONNECTIONS_PER_IP:
         ip_connections[client_ip] -= 1
+        SESSIONS_TOTAL.labels("rate_limited").inc()
         logger.warning(f"[{client_id}] Rate limit exceeded for {client_ip}")
         await websocket.send(json.dumps({"error": "Too many connections", "code": 429}))
         await websocket.close(4029, "Rate limit exceeded")
         return
     
+    # Session class for admission: ?mode=diarize or {"auth": ..., "mode": "diarize"}; same for ?codec=opus
+    query = parse_qs(urlparse(request_path(websocket)).query)
+    requested_mode = query.get("mode", [""])[0]
+    requested_codec = query.get("codec", [""])[0]
+
     # ── Authentication: expect HMAC token as first message ──
     if WS_TOKEN_SECRET:
         try:
             auth_msg = await asyncio.wait_for(websocket.recv(), timeout=10.0)
             if not isinstance(auth_msg, str):
+                SESSIONS_TOTAL.labels("unauthorized").inc()
                 await websocket.send(json.dumps({"error": "Unauthorized", "code": 401}))
                 await websocket.close(4001, "Unauthorized")
                 ip_connections[client_ip] -= 1
@@ -372,12 +1338,15 @@ async def handle_client(websocket):
             try:
                 auth_data = json.loads(auth_msg)
                 token = auth_data.get("auth", "")
+                requested_mode = auth_data.get("mode", requested_mode)
+                requested_codec = auth_data.get("codec", requested_codec)
             except (json.JSONDecodeError, AttributeError):
                 token = ""
             
             is_valid, err_msg = verify_hmac_token(token)
             if not is_valid:
                 logger.warning(f"[{client_id}] Unauthorized: {err_msg}")
+                SESSIONS_TOTAL.labels("unauthorized").inc()
                 await websocket.send(json.dumps({"error": "Unauthorized", "code": 401}))
                 await websocket.close(4001, "Unauthorized")
                 ip_connections[client_ip] -= 1
@@ -386,28 +1355,153 @@ async def handle_client(websocket):
             await websocket.send(json.dumps({"status": "authenticated"}))
         except asyncio.TimeoutError:
             logger.warning(f"[{client_id}] Auth timeout")
+            SESSIONS_TOTAL.labels("unauthorized").inc()
             await websocket.send(json.dumps({"error": "Auth timeout", "code": 401}))
             await websocket.close(4001, "Auth timeout")
             ip_connections[client_ip] -= 1
             return
     
+    # ── Startup + admission: the session may wait for models, then for a slot ──
+    # Keep reading while it waits: clients stream audio right after auth, and an unread
+    # socket stops answering pings once its receive queue fills. Held audio is replayed
+    # when the session starts.
+    held_messages = []
+
+    async def hold_messages():
+        held_bytes = 0
+        while held_bytes <= MAX_AUDIO_BUFFER_BYTES:
+            message = await websocket.recv()
+            held_messages.append(message)
+            held_bytes += len(message)
+
+    holder = asyncio.create_task(hold_messages())
+    admission_result = "closed"
+    try:
+        if not await wait_for_models(websocket, client_id):
+            admission_result = "deferred"
+        else:
+            admission_result = await admission.acquire(websocket, client_id, requested_mode == "diarize")
+    except websockets.exceptions.ConnectionClosed:
+        pass
+    finally:
+        holder.cancel()
+        await asyncio.gather(holder, return_exceptions=True)
+        # Also on unexpected errors/cancellation — a session that never started must not keep its IP slot
+        if admission_result != "admitted":
+            ip_connections[client_ip] -= 1
+            if ip_connections[client_ip] <= 0:
+                del ip_connections[client_ip]
+            admission.release(client_id)
+    if admission_result != "admitted":
+        if admission_result == "closed":
+            return
+        if admission_result == "deferred":
+            SESSIONS_TOTAL.labels("deferred").inc()
+            return
+        SESSIONS_TOTAL.labels("rejected_busy" if admission_result == "busy" else "queue_timeout").inc()
+        logger.warning(f"[{client_id}] Not admitted ({admission_result}), {admission.status()}")
+        try:
+            await websocket.send(json.dumps({
+                "error": "Server busy",
+                "code": 503,
+                "retry_after": ADMISSION_RETRY_AFTER_SEC,
+            }))
+            await websocket.close(4503, "Server busy")
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        return
+
     logger.info(f"[{client_id}] Client connected from {client_ip} ({ip_connections[client_ip]} active)")
+    SESSIONS_TOTAL.labels("accepted").inc()
+    session_start = time.monotonic()
+    session_buffer_bytes[client_id] = 0
+    if worker_pool is not None:
+        worker_pool.assign(client_id)
 
     audio_buffer = bytearray()
     full_transcript = ""
     chunk_count = 0
-    diarize_mode = False  # Client can request diarization via {"mode": "diarize"}
+    diarize_mode = requested_mode == "diarize"  # Client can also request diarization via {"mode": "diarize"}
+    opus_stream = None  # set once the client negotiates {"codec": "opus"}
     all_audio_for_diarize = bytearray()  # Keep full audio for post-hoc diarization
+    window_queue: asyncio.Queue = asyncio.Queue()  # float32 windows awaiting decode
+    queued_window_bytes = 0
+    qos = QosController(client_id)
+
+    async def decode_windows():
+        """Per-session decoder: drains window_queue so receiving (and pings) never wait on inference."""
+        nonlocal full_transcript, queued_window_bytes
+        while True:
+            audio_float = await window_queue.get()
+            try:
+                backlog = window_queue.qsize()
+                WINDOW_BACKLOG.observe(backlog)
+                tier = qos.before_window(backlog)
+                # Transcribe (faster-whisper's built-in VAD handles silence)
+                text, queue_wait, decode_sec = await run_decode(
+                    client_id, "window", transcribe, audio_float, full_transcript, tier,
+                )
+                qos.after_window(queue_wait, decode_sec)
+                if tier is QOS_TIERS[0]:
+                    admission.observe_window(decode_sec)
+                QOS_WINDOWS_TOTAL.labels(tier["name"]).inc()
+                trace(client_id, "qos", tier=tier["name"], backlog=backlog, load=qos.load_ema or 0.0)
+                text = clean_transcript(text)
+                if not text:
+                    WINDOWS_TOTAL.labels("no_speech").inc()
+                elif is_hallucination(text):
+                    WINDOWS_TOTAL.labels("hallucination").inc()
+                else:
+                    WINDOWS_TOTAL.labels("text").inc()
+                    full_transcript += (" " + text) if full_transcript else text
+                    await websocket.send(json.dumps({
+                        "text": text,
+                        "is_final": False,
+                        "tier": tier["name"],
+                    }))
+                    logger.info(f"[{client_id}] Chunk {chunk_count} ({tier['name']}): \"{text[:60]}...\"")
+            except websockets.exceptions.ConnectionClosed:
+                return  # receive loop sees the close and ends the session
+            except Exception as e:
+                logger.error(f"[{client_id}] Window decode failed: {e}")
+            finally:
+                # ZERO-RETENTION: window leaves RAM once decoded
+                queued_window_bytes -= audio_float.nbytes
+                del audio_float
+                window_queue.task_done()
 
-    try:
+    decoder_task = asyncio.create_task(decode_windows())
+
+    async def session_messages():
+        """Messages held while queued for admission, then the live stream."""
+        while held_messages:
+            yield held_messages.pop(0)
         async for message in websocket:
+            yield message
+
+    try:
+        if requested_codec:
+            accepted, opus_stream = await negotiate_codec(websocket, client_id, requested_codec)
+            if not accepted:
+                return
+
+        async for message in session_messages():
             # Text message = control command
             if isinstance(message, str):
-                # Check for mode command
+                # Check for mode / codec command
                 try:
                     cmd = json.loads(message)
+                    if cmd.get("codec"):
+                        if chunk_count:
+                            await websocket.send(json.dumps({"error": "Codec must be set before audio", "code": 400}))
+                            continue
+                        accepted, opus_stream = await negotiate_codec(websocket, client_id, cmd["codec"])
+                        if not accepted:
+                            break
+                        continue
                     if cmd.get("mode") == "diarize":
                         diarize_mode = True
+                        admission.reweight(client_id, diarize=True)
                         logger.info(f"[{client_id}] Diarization mode enabled")
                         await websocket.send(json.dumps({"status": "diarize_enabled"}))
                         continue
@@ -415,11 +1509,16 @@ async def handle_client(websocket):
                     pass
                 
                 if message.strip().upper() == "STOP":
+                    # Queued windows first — keeps transcript order
+                    await window_queue.join()
+
                     # Final transcription of any remaining audio
                     if len(audio_buffer) > 0:
                         audio_float = int16_to_float32(bytes(audio_buffer))
                         if len(audio_float) / SAMPLE_RATE >= MIN_AUDIO_SEC:
-                            text = transcribe(audio_float, previous_text=full_transcript)
+                            text, _, _ = await run_decode(
+                                client_id, "final", transcribe, audio_float, full_transcript, qos.tier,
+                            )
                             text = clean_transcript(text)
                             if text and not is_hallucination(text):
                                 full_transcript += (" " + text) if full_transcript else text
@@ -430,9 +1529,17 @@ async def handle_client(websocket):
                     # If diarize mode: run diarization on full audio
                     diarized_transcript = ""
                     if diarize_mode and len(all_audio_for_diarize) > 0:
+                        if not diarize_ready.is_set():
+                            logger.info(f"[{client_id}] Waiting for diarization pipeline...")
+                            try:
+                                await asyncio.wait_for(diarize_ready.wait(), timeout=MODEL_WAIT_TIMEOUT_SEC)
+                            except asyncio.TimeoutError:
+                                logger.warning(f"[{client_id}] Diarization pipeline not ready, falling back")
                         logger.info(f"[{client_id}] Running post-hoc diarization...")
                         full_audio = int16_to_float32(bytes(all_audio_for_diarize))
-                        diarized_transcript = transcribe_with_speakers(full_audio)
+                        diarized_transcript, _, _ = await run_decode(
+                            client_id, "diarize", transcribe_with_speakers, full_audio,
+                        )
                         # ZERO-RETENTION
                         all_audio_for_diarize.clear()
                         del full_audio
@@ -447,34 +1554,31 @@ async def handle_client(websocket):
                     break
                 continue
 
-            # Binary message = audio chunk (Int16 PCM, 16kHz mono)
-            audio_buffer.extend(message)
+            # Binary message = audio chunk (Int16 PCM, 16kHz mono) or one Opus packet, decoded here —
+            # buffers, limits and windows below all count decoded samples
+            INGRESS_BYTES_TOTAL.labels("opus" if opus_stream is not None else "pcm").inc(len(message))
+            pcm = opus_stream.decode(message) if opus_stream is not None else message
+            audio_buffer.extend(pcm)
             if diarize_mode:
-                all_audio_for_diarize.extend(message)
+                all_audio_for_diarize.extend(pcm)
             chunk_count += 1
+            AUDIO_SECONDS_TOTAL.inc(len(pcm) / 2 / SAMPLE_RATE)
+            session_buffer_bytes[client_id] = len(audio_buffer) + len(all_audio_for_diarize) + queued_window_bytes
 
-            # ── Payload size limit: reject if buffer exceeds max ──
-            if len(audio_buffer) > MAX_AUDIO_BUFFER_BYTES or len(all_audio_for_diarize) > MAX_AUDIO_BUFFER_BYTES:
+            # ── Payload size limit: reject if buffer (incl. undecoded backlog) exceeds max ──
+            pending_pcm_bytes = len(audio_buffer) + queued_window_bytes // 2  # float32 → Int16 equivalent
+            if pending_pcm_bytes > MAX_AUDIO_BUFFER_BYTES or len(all_audio_for_diarize) > MAX_AUDIO_BUFFER_BYTES:
                 logger.warning(f"[{client_id}] Audio buffer exceeded {MAX_AUDIO_BUFFER_BYTES} bytes, closing")
                 await websocket.send(json.dumps({"error": "Audio too large", "code": 413}))
                 break
 
-            # Process when we have enough audio
+            # Queue a window for the decoder when we have enough audio
             buffer_duration = len(audio_buffer) / 2 / SAMPLE_RATE  # Int16 = 2 bytes per sample
             if buffer_duration >= BUFFER_DURATION_SEC:
                 audio_float = int16_to_float32(bytes(audio_buffer))
-
-                # Transcribe (faster-whisper's built-in VAD handles silence)
-                if len(audio_float) / SAMPLE_RATE >= MIN_AUDIO_SEC:
-                    text = transcribe(audio_float, previous_text=full_transcript)
-                    text = clean_transcript(text)
-                    if text and not is_hallucination(text):
-                        full_transcript += (" " + text) if full_transcript else text
-                        await websocket.send(json.dumps({
-                            "text": text,
-                            "is_final": False,
-                        }))
-                        logger.info(f"[{client_id}] Chunk {chunk_count}: \"{text[:60]}...\"")
+                queued_window_bytes += audio_float.nbytes
+                window_queue.put_nowait(audio_float)
+                del audio_float
 
                 # ZERO-RETENTION: keep overlap, clear rest from RAM
                 overlap_bytes = int(OVERLAP_DURATION_SEC * SAMPLE_RATE * 2)  # 2 bytes per Int16 sample
@@ -482,7 +1586,6 @@ async def handle_client(websocket):
                     audio_buffer = bytearray(audio_buffer[-overlap_bytes:])
                 else:
                     audio_buffer.clear()
-                del audio_float
 
     except websockets.exceptions.ConnectionClosed:
         logger.info(f"[{client_id}] Client disconnected")
@@ -494,8 +1597,18 @@ async def handle_client(websocket):
             pass
     finally:
         # ZERO-RETENTION: ensure cleanup
+        decoder_task.cancel()
+        held_messages.clear()
+        while not window_queue.empty():
+            window_queue.get_nowait()
         audio_buffer.clear()
         all_audio_for_diarize.clear()
+        session_buffer_bytes.pop(client_id, None)
+        admission.release(client_id)
+        if worker_pool is not None:
+            worker_pool.release(client_id)
+        SESSION_SECONDS.observe(time.monotonic() - session_start)
+        trace(client_id, "session", duration=time.monotonic() - session_start, chunks=chunk_count)
         # Rate limiting: decrement connection count
         ip_connections[client_ip] -= 1
         if ip_connections[client_ip] <= 0:
@@ -513,7 +1626,41 @@ HTTP_PORT = int(os.environ.get("HTTP_PORT", "8766"))
 
 
 class DiarizeHandler(BaseHTTPRequestHandler):
-    """HTTP handler for /transcribe-diarize endpoint."""
+    """HTTP handler for /transcribe-diarize, /health and /metrics endpoints."""
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE_LATEST)
+            self.end_headers()
+            self.wfile.write(generate_latest())
+            return
+
+        if self.path != "/health":
+            self.send_response(404)
+            self.end_headers()
+            self.wfile.write(b'{"error": "Not found"}')
+            return
+
+        # Readiness probe — no auth, exposes only model status
+        ready = models_available()
+        if ready:
+            status = "ready"
+        elif models_ready.is_set():
+            status = "failed"
+        else:
+            status = "loading"
+        self.send_response(200 if ready else 503)
+        self.send_header("Content-Type", "application/json")
+        if not ready:
+            self.send_header("Retry-After", str(MODEL_RETRY_AFTER_SEC))
+        self.end_headers()
+        self.wfile.write(json.dumps({
+            "status": status,
+            "models": model_status,
+            "sessions": admission.status(),
+            "workers": worker_pool.status() if worker_pool is not None else None,
+        }).encode())
 
     def do_POST(self):
         # ── Authentication: validate API key (timing-safe) ──
@@ -533,6 +1680,14 @@ class DiarizeHandler(BaseHTTPRequestHandler):
             self.wfile.write(b'{"error": "Not found"}')
             return
 
+        if not models_available():
+            self.send_response(503)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Retry-After", str(MODEL_RETRY_AFTER_SEC))
+            self.end_headers()
+            self.wfile.write(b'{"error": "Models loading, retry later"}')
+            return
+
         try:
             content_length = int(self.headers.get("Content-Length", 0))
             
@@ -583,14 +1738,19 @@ class DiarizeHandler(BaseHTTPRequestHandler):
             logger.info(f"HTTP diarize: {len(audio_float)} samples ({len(audio_float) / SAMPLE_RATE:.1f}s)")
 
             # Transcribe plain text
-            plain_text = transcribe(audio_float)
+            decode_start = time.monotonic()
+            plain_text = decode_blocking(transcribe, audio_float)
             plain_text = clean_transcript(plain_text)
+            decode_sec = time.monotonic() - decode_start
+            DECODE_SECONDS.labels("http").observe(decode_sec)
+            if len(audio_float) > 0:
+                DECODE_RTF.labels("http").observe(decode_sec / (len(audio_float) / SAMPLE_RATE))
 
             # Transcribe with speakers
             diarized_text = ""
             speaker_count = 0
-            if diarize_pipeline is not None:
-                diarized_text = transcribe_with_speakers(audio_float)
+            if model_status["diarize"] == "ready":
+                diarized_text = decode_blocking(transcribe_with_speakers, audio_float)
                 if diarized_text:
                     # Count unique speakers
                     speaker_labels = set(re.findall(r'\[Mówca \d+\]', diarized_text))
@@ -622,6 +1782,13 @@ class DiarizeHandler(BaseHTTPRequestHandler):
             self.end_headers()
             self.wfile.write(json.dumps({"error": "Internal server error"}).encode())
 
+    def send_response(self, code, message=None):
+        # self.path is unset when parse_request rejects a malformed request line
+        path = getattr(self, "path", "")
+        path = path if path in ("/transcribe-diarize", "/health", "/metrics") else "other"
+        HTTP_REQUESTS_TOTAL.labels(path, str(code)).inc()
+        super().send_response(code, message)
+
     def do_OPTIONS(self):
         """Handle CORS preflight."""
         self.send_response(200)
@@ -640,7 +1807,7 @@ class DiarizeHandler(BaseHTTPRequestHandler):
 def start_http_server():
     """Start HTTP server in a background thread."""
     server = http.server.HTTPServer((WS_HOST, HTTP_PORT), DiarizeHandler)
-    logger.info(f"HTTP diarization server on http://{WS_HOST}:{HTTP_PORT}/transcribe-diarize")
+    logger.info(f"HTTP server on http://{WS_HOST}:{HTTP_PORT} (/transcribe-diarize, /health)")
     server.serve_forever()
 
 
@@ -649,6 +1816,9 @@ async def main():
     http_thread = threading.Thread(target=start_http_server, daemon=True)
     http_thread.start()
 
+    # Load models in the background — ports are bound right away
+    loader_task = asyncio.create_task(load_models())
+
     logger.info(f"Starting WebSocket server on ws://{WS_HOST}:{WS_PORT}")
     async with websockets.serve(
         handle_client,
@@ -659,6 +1829,7 @@ async def main():
         ping_timeout=10,
     ):
         logger.info("WebSocket server running. Waiting for connections...")
+        await loader_task
         await asyncio.Future()  # run forever
 
 
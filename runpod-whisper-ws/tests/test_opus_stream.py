@@ -0,0 +1,126 @@
+"""Opus transport: sequence numbers, gap concealment (PLC + FEC), late and corrupt packets."""
+
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+np = pytest.importorskip("numpy")
+opuslib = pytest.importorskip("opuslib")
+import opuslib.api.ctl
+import opuslib.api.encoder
+pytest.importorskip("websockets")
+from prometheus_client import REGISTRY
+
+_spec = importlib.util.spec_from_file_location(
+    "whisper_ws_server", Path(__file__).resolve().parents[1] / "server.py"
+)
+server = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(server)
+
+RATE = server.SAMPLE_RATE
+FRAME = RATE // 50  # 20 ms
+FRAME_BYTES = FRAME * 2
+
+
+def frames(count: int, frame_samples: int = FRAME) -> list[bytes]:
+    """Opus packets of a 220 Hz tone, encoded with in-band FEC like the clients do."""
+    encoder = opuslib.Encoder(RATE, 1, opuslib.APPLICATION_VOIP)
+    # Encoder.inband_fec's setter is broken in opuslib 3.0.1 — same workaround as bench/loadtest.py
+    opuslib.api.encoder.encoder_ctl(encoder.encoder_state, opuslib.api.ctl.set_inband_fec, 1)
+    opuslib.api.encoder.encoder_ctl(encoder.encoder_state, opuslib.api.ctl.set_packet_loss_perc, 20)
+    t = np.arange(count * frame_samples) / RATE
+    pcm = (np.sin(2 * np.pi * 220 * t) * 8000).astype(np.int16)
+    return [
+        encoder.encode(pcm[i * frame_samples:(i + 1) * frame_samples].tobytes(), frame_samples)
+        for i in range(count)
+    ]
+
+
+def message(seq: int, packet: bytes) -> bytes:
+    return (seq & 0xFFFF).to_bytes(2, "big") + packet
+
+
+def counted(outcome: str) -> float:
+    return REGISTRY.get_sample_value("whisper_opus_frames_total", {"outcome": outcome}) or 0.0
+
+
+@pytest.fixture
+def counts():
+    """Counter deltas since the test started."""
+    before = {o: counted(o) for o in ("decoded", "plc", "fec", "late", "corrupt", "skipped")}
+    return lambda: {o: counted(o) - v for o, v in before.items() if counted(o) - v}
+
+
+def test_in_order_frames(counts):
+    stream = server.OpusStream()
+    out = [stream.decode(message(seq, p)) for seq, p in enumerate(frames(5))]
+    assert [len(pcm) for pcm in out] == [FRAME_BYTES] * 5
+    assert counts() == {"decoded": 5}
+
+
+def test_single_gap_recovered_with_fec(counts):
+    packets = frames(4)
+    stream = server.OpusStream()
+    stream.decode(message(0, packets[0]))
+    stream.decode(message(1, packets[1]))
+    pcm = stream.decode(message(3, packets[3]))  # 2 dropped
+    assert len(pcm) == 2 * FRAME_BYTES
+    assert counts() == {"decoded": 3, "fec": 1}
+
+
+def test_longer_gap_plc_then_fec(counts):
+    packets = frames(5)
+    stream = server.OpusStream()
+    stream.decode(message(0, packets[0]))
+    pcm = stream.decode(message(4, packets[4]))  # 1, 2, 3 dropped
+    assert len(pcm) == 4 * FRAME_BYTES
+    assert counts() == {"decoded": 2, "plc": 2, "fec": 1}
+
+
+def test_long_dropout_is_not_filled(counts):
+    gap = server.OPUS_MAX_CONCEAL_FRAMES + 20
+    packets = frames(gap + 1)
+    stream = server.OpusStream()
+    stream.decode(message(0, packets[0]))
+    pcm = stream.decode(message(gap + 1, packets[-1]))
+    assert len(pcm) == (server.OPUS_MAX_CONCEAL_FRAMES + 1) * FRAME_BYTES
+    assert counts() == {"decoded": 2, "plc": server.OPUS_MAX_CONCEAL_FRAMES, "skipped": 20}
+
+
+def test_late_and_duplicate_packets_dropped(counts):
+    packets = frames(3)
+    stream = server.OpusStream()
+    stream.decode(message(0, packets[0]))
+    stream.decode(message(2, packets[2]))
+    assert stream.decode(message(1, packets[1])) == b""  # its slot was already concealed
+    assert stream.decode(message(2, packets[2])) == b""
+    assert counts()["late"] == 2
+    assert stream.next_seq == 3
+
+
+def test_sequence_wraps_around(counts):
+    packets = frames(3)
+    stream = server.OpusStream()
+    out = [stream.decode(message(seq, p)) for seq, p in zip((0xFFFE, 0xFFFF, 0), packets)]
+    assert [len(pcm) for pcm in out] == [FRAME_BYTES] * 3
+    assert counts() == {"decoded": 3}
+
+
+def test_corrupt_packets_concealed(counts):
+    packets = frames(2)
+    stream = server.OpusStream()
+    stream.decode(message(0, packets[0]))
+    assert stream.decode(b"\x00") == b""  # too short to carry a sequence number
+    assert len(stream.decode(message(1, b"\xff" * 3))) == FRAME_BYTES  # undecodable → one PLC frame
+    assert len(stream.decode(message(2, packets[1]))) == FRAME_BYTES
+    assert counts() == {"decoded": 2, "corrupt": 2, "plc": 1}
+
+
+def test_plc_follows_frame_size():
+    frame_40ms = 2 * FRAME
+    packets = frames(3, frame_40ms)
+    stream = server.OpusStream()
+    stream.decode(message(0, packets[0]))
+    assert stream.frame_samples == frame_40ms
+    assert len(stream.decode(message(2, packets[2]))) == 2 * frame_40ms * 2
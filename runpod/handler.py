@@ -1,12 +1,18 @@
 """
 RunPod Serverless Handler for Bielik-11B (llama-cpp-python)
 Supports: chat completions + embeddings
+Embeddings optionally truncated and int8/binary-quantised, base64-encoded (encoding_format).
 Model downloaded on first cold start, then cached.
+Optional speculative decoding (SPECULATIVE_MODE): prompt lookup or a small draft model.
 """
 
 import runpod
+import base64
 import os
+import time
+import numpy as np
 from huggingface_hub import hf_hub_download
+from llama_cpp.llama_speculative import LlamaDraftModel, LlamaPromptLookupDecoding
 
 MODEL_DIR = "/models"
 MODEL_REPO = "speakleash/Bielik-11B-v2.6-Instruct-GGUF"
@@ -16,23 +22,174 @@ MODEL_PATH = os.path.join(MODEL_DIR, MODEL_FILE)
 N_GPU_LAYERS = int(os.environ.get("N_GPU_LAYERS", "-1"))
 CTX_SIZE = int(os.environ.get("CTX_SIZE", "4096"))
 
+# Speculative decoding: "off", "prompt_lookup" (drafts copied from the prompt — RAG answers
+# quote the retrieved transcript often) or "draft_model" (small GGUF sharing Bielik's tokenizer)
+SPECULATIVE_MODE = os.environ.get("SPECULATIVE_MODE", "off").lower()
+# Tokens drafted per step
+DRAFT_LENGTH = int(os.environ.get("DRAFT_LENGTH", "10"))
+# prompt_lookup: longest n-gram of the latest tokens searched for in the prompt
+PROMPT_LOOKUP_NGRAM = int(os.environ.get("PROMPT_LOOKUP_NGRAM", "3"))
+# draft_model: GGUF on Hugging Face, must use the same tokenizer as Bielik
+DRAFT_MODEL_REPO = os.environ.get("DRAFT_MODEL_REPO", "")
+DRAFT_MODEL_FILE = os.environ.get("DRAFT_MODEL_FILE", "")
+# Polish probe text for the draft/main tokenizer check
+TOKENIZER_PROBE = "Zażółć gęślą jaźń. Spotkanie zespołu: budżet na 2025 rok, terminy wdrożenia."
 
-def download_model():
+# Embedding encodings: "float" = JSON list (default, unchanged); the others are base64 of
+# little-endian float32 / int8 (+ per-vector "scale") / sign bits packed MSB-first
+EMBEDDING_FORMATS = ("float", "base64", "int8", "binary")
+
+
+def download_model(repo=MODEL_REPO, filename=MODEL_FILE):
     """Download model if not already cached."""
-    if os.path.exists(MODEL_PATH):
-        print(f"Model already cached at {MODEL_PATH}")
-        return
-    print(f"Downloading {MODEL_FILE} from {MODEL_REPO}...")
+    path = os.path.join(MODEL_DIR, filename)
+    if os.path.exists(path):
+        print(f"Model already cached at {path}")
+        return path
+    print(f"Downloading {filename} from {repo}...")
     os.makedirs(MODEL_DIR, exist_ok=True)
     hf_hub_download(
-        repo_id=MODEL_REPO,
-        filename=MODEL_FILE,
+        repo_id=repo,
+        filename=filename,
         local_dir=MODEL_DIR,
     )
     print("Download complete!")
+    return path
+
+
+class SmallModelDraft(LlamaDraftModel):
+    """Greedy drafts from a small Llama; its own KV cache is reused via prefix matching."""
+
+    def __init__(self, model, num_pred_tokens):
+        self.model = model
+        self.num_pred_tokens = num_pred_tokens
+
+    def __call__(self, input_ids, /, **kwargs):
+        # llama-cpp-python trims the draft only after we return — never decode past our own n_ctx
+        room = min(self.num_pred_tokens, self.model.n_ctx() - len(input_ids))
+        if room <= 0:
+            return np.array([], dtype=np.intc)
+        draft = []
+        for token in self.model.generate(input_ids.tolist(), temp=0.0):
+            if token == self.model.token_eos():
+                break
+            draft.append(token)
+            if len(draft) >= room:
+                break
+        return np.array(draft, dtype=np.intc)
+
+
+class AcceptanceTracker(LlamaDraftModel):
+    """
+    Wraps the draft model to measure acceptance. llama-cpp-python doesn't report it,
+    but it calls the draft model once per verification step with everything accepted
+    so far plus one freshly sampled token — so the input grew by accepted + 1.
+    The last step of a completion can't be observed and is left out.
+    """
+
+    def __init__(self, draft, mode):
+        self.draft = draft
+        self.mode = mode
+        self.reset()
+
+    def reset(self):
+        self.last_length = None
+        self.last_drafted = 0
+        self.drafted = 0
+        self.accepted = 0
+
+    def __call__(self, input_ids, /, **kwargs):
+        length = len(input_ids)
+        if self.last_length is not None and self.last_drafted:
+            self.drafted += self.last_drafted
+            self.accepted += min(max(length - self.last_length - 1, 0), self.last_drafted)
+        draft = self.draft(input_ids, **kwargs)
+        self.last_length, self.last_drafted = length, len(draft)
+        return draft
+
+    def stats(self):
+        return {
+            "drafted": self.drafted,
+            "accepted": self.accepted,
+            "acceptance_rate": round(self.accepted / self.drafted, 3) if self.drafted else None,
+        }
+
+
+def encode_embedding(embedding, encoding_format="float", dimensions=None):
+    """Truncate + quantise an embedding for compact transport.
 
+    Truncation keeps the leading `dimensions` values and re-normalises to unit
+    length, so cosine scores stay comparable across sizes.
+    """
+    if encoding_format not in EMBEDDING_FORMATS:
+        raise ValueError(f"encoding_format must be one of {', '.join(EMBEDDING_FORMATS)}")
+    if encoding_format == "float" and not dimensions:
+        return {"embedding": embedding}
 
-def load_model():
+    vec = np.asarray(embedding, dtype=np.float32)
+    if vec.ndim != 1:
+        raise ValueError("Compact embedding encodings need a pooled (1-D) embedding")
+    if dimensions:
+        dimensions = int(dimensions)
+        if not 0 < dimensions <= vec.size:
+            raise ValueError(f"dimensions must be between 1 and {vec.size}")
+        vec = vec[:dimensions]
+    norm = float(np.linalg.norm(vec))
+    if norm > 0:
+        vec = vec / norm
+
+    result = {"encoding_format": encoding_format, "dimensions": int(vec.size)}
+    if encoding_format == "float":
+        result["embedding"] = vec.tolist()
+        return result
+    if encoding_format == "base64":
+        data = vec.astype("<f4").tobytes()
+    elif encoding_format == "int8":
+        peak = float(np.abs(vec).max())
+        scale = peak / 127 if peak > 0 else 1.0
+        data = np.round(vec / scale).astype(np.int8).tobytes()
+        result["scale"] = scale
+    else:
+        data = np.packbits(vec > 0).tobytes()
+    result["embedding"] = base64.b64encode(data).decode("ascii")
+    return result
+
+
+def load_draft():
+    """Draft model for SPECULATIVE_MODE, wrapped in an AcceptanceTracker (None = off)."""
+    if SPECULATIVE_MODE == "off":
+        return None
+    if SPECULATIVE_MODE == "draft_model":
+        if DRAFT_MODEL_REPO and DRAFT_MODEL_FILE:
+            from llama_cpp import Llama
+            path = download_model(DRAFT_MODEL_REPO, DRAFT_MODEL_FILE)
+            print(f"Loading draft model: {path}")
+            draft = Llama(model_path=path, n_gpu_layers=N_GPU_LAYERS, n_ctx=CTX_SIZE, verbose=False)
+            return AcceptanceTracker(SmallModelDraft(draft, DRAFT_LENGTH), "draft_model")
+        print("SPECULATIVE_MODE=draft_model needs DRAFT_MODEL_REPO and DRAFT_MODEL_FILE — using prompt_lookup")
+    elif SPECULATIVE_MODE != "prompt_lookup":
+        print(f"Unknown SPECULATIVE_MODE={SPECULATIVE_MODE} — using prompt_lookup")
+    return AcceptanceTracker(
+        LlamaPromptLookupDecoding(max_ngram_size=PROMPT_LOOKUP_NGRAM, num_pred_tokens=DRAFT_LENGTH),
+        "prompt_lookup",
+    )
+
+
+def check_draft_tokenizer(model, tracker):
+    """Drafts are token ids — a draft model with another vocabulary would never be accepted."""
+    if tracker is None or not isinstance(tracker.draft, SmallModelDraft):
+        return
+    draft = tracker.draft.model
+    probe = TOKENIZER_PROBE.encode("utf-8")
+    if draft.n_vocab() == model.n_vocab() and draft.tokenize(probe) == model.tokenize(probe):
+        return
+    print("Draft model tokenizer differs from Bielik's — falling back to prompt_lookup")
+    tracker.draft = LlamaPromptLookupDecoding(max_ngram_size=PROMPT_LOOKUP_NGRAM, num_pred_tokens=DRAFT_LENGTH)
+    tracker.mode = "prompt_lookup"
+    draft.close()
+
+
+def load_model(draft=None):
     """Load model into GPU."""
     from llama_cpp import Llama
     print(f"Loading model: {MODEL_PATH}")
@@ -41,17 +198,13 @@ def load_model():
         n_gpu_layers=N_GPU_LAYERS,
         n_ctx=CTX_SIZE,
         embedding=True,
+        draft_model=draft,
         verbose=False,
     )
-    print("Model loaded!")
+    print("Model loaded!" + (f" (speculative: {draft.mode}, draft length {DRAFT_LENGTH})" if draft else ""))
     return model
 
 
-# Download + load on cold start
-download_model()
-llm = load_model()
-
-
 def handler(event):
     """RunPod handler — chat completions or embeddings."""
     input_data = event.get("input", {})
@@ -63,22 +216,47 @@ def handler(event):
             text = payload.get("content", payload.get("input", ""))
             result = llm.create_embedding(text)
             embedding = result["data"][0]["embedding"]
-            return {"embedding": embedding}
+            return encode_embedding(
+                embedding,
+                payload.get("encoding_format", "float"),
+                payload.get("dimensions"),
+            )
 
         else:
             messages = payload.get("messages", [])
             max_tokens = payload.get("max_tokens", 1024)
             temperature = payload.get("temperature", 0.7)
 
+            if speculative is not None:
+                speculative.reset()
+            start = time.monotonic()
             result = llm.create_chat_completion(
                 messages=messages,
                 max_tokens=max_tokens,
                 temperature=temperature,
             )
+            if speculative is not None:
+                elapsed = time.monotonic() - start
+                tokens = result.get("usage", {}).get("completion_tokens", 0)
+                result["speculative"] = {
+                    "mode": speculative.mode,
+                    "draft_length": DRAFT_LENGTH,
+                    **speculative.stats(),
+                    # Completion tokens per second, prompt processing included
+                    "tokens_per_sec": round(tokens / elapsed, 1) if elapsed > 0 else None,
+                }
+                print(f"Speculative: {result['speculative']}")
             return result
 
     except Exception as e:
         return {"error": str(e)}
 
 
-runpod.serverless.start({"handler": handler})
+if __name__ == "__main__":
+    # Download + load on cold start
+    download_model()
+    speculative = load_draft()
+    llm = load_model(speculative)
+    check_draft_tokenizer(llm, speculative)
+
+    runpod.serverless.start({"handler": handler})
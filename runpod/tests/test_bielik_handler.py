@@ -0,0 +1,128 @@
+"""CPU-only tests for the Bielik handler — no model download, no GPU."""
+
+import base64
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("llama_cpp")
+pytest.importorskip("runpod")
+pytest.importorskip("huggingface_hub")
+
+_spec = importlib.util.spec_from_file_location(
+    "bielik_handler", Path(__file__).resolve().parents[1] / "handler.py"
+)
+handler = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(handler)
+
+
+class FakeDraftLlama:
+    """Counts up from the last token and, like llama_decode, fails past n_ctx."""
+
+    def __init__(self, n_ctx, eos=-1):
+        self._n_ctx = n_ctx
+        self._eos = eos
+
+    def n_ctx(self):
+        return self._n_ctx
+
+    def token_eos(self):
+        return self._eos
+
+    def generate(self, tokens, temp=0.0):
+        tokens = list(tokens)
+        while True:
+            if len(tokens) > self._n_ctx:
+                raise RuntimeError("llama_decode returned 1")
+            token = tokens[-1] + 1
+            yield token
+            tokens.append(token)
+
+
+def ids(n):
+    return np.arange(1, n + 1, dtype=np.intc)
+
+
+def test_small_model_draft_full_length_with_room():
+    draft = handler.SmallModelDraft(FakeDraftLlama(n_ctx=64), num_pred_tokens=4)
+    out = draft(ids(10))
+    assert out.dtype == np.intc
+    assert out.tolist() == [11, 12, 13, 14]
+
+
+def test_small_model_draft_stops_at_context_edge():
+    draft = handler.SmallModelDraft(FakeDraftLlama(n_ctx=64), num_pred_tokens=10)
+    for n in range(55, 65):
+        out = draft(ids(n))
+        assert len(out) == min(10, 64 - n)
+
+
+def test_small_model_draft_no_room_returns_empty():
+    draft = handler.SmallModelDraft(FakeDraftLlama(n_ctx=64), num_pred_tokens=10)
+    out = draft(ids(64))
+    assert out.dtype == np.intc
+    assert out.tolist() == []
+
+
+def test_small_model_draft_stops_at_eos():
+    draft = handler.SmallModelDraft(FakeDraftLlama(n_ctx=64, eos=13), num_pred_tokens=10)
+    assert draft(ids(10)).tolist() == [11, 12]
+
+
+# ── Embedding encoding ───────────────────────────────────────────────
+
+EMBEDDING = (np.random.default_rng(0).standard_normal(1024)).tolist()
+
+
+def decoded(result):
+    data = base64.b64decode(result["embedding"])
+    if result["encoding_format"] == "base64":
+        return np.frombuffer(data, dtype="<f4")
+    if result["encoding_format"] == "int8":
+        return np.frombuffer(data, dtype=np.int8) * result["scale"]
+    return np.unpackbits(np.frombuffer(data, dtype=np.uint8))[: result["dimensions"]]
+
+
+def unit(vec):
+    vec = np.asarray(vec, dtype=np.float32)
+    return vec / np.linalg.norm(vec)
+
+
+def test_embedding_float_unchanged_by_default():
+    assert handler.encode_embedding(EMBEDDING) == {"embedding": EMBEDDING}
+
+
+def test_embedding_truncated_and_renormalised():
+    result = handler.encode_embedding(EMBEDDING, "float", 256)
+    assert result["dimensions"] == 256
+    np.testing.assert_allclose(result["embedding"], unit(EMBEDDING[:256]), rtol=1e-5)
+
+
+def test_embedding_base64_float32():
+    result = handler.encode_embedding(EMBEDDING, "base64")
+    assert len(base64.b64decode(result["embedding"])) == 4 * 1024
+    np.testing.assert_allclose(decoded(result), unit(EMBEDDING), rtol=1e-6)
+
+
+def test_embedding_int8_keeps_cosine():
+    result = handler.encode_embedding(EMBEDDING, "int8", 512)
+    assert len(base64.b64decode(result["embedding"])) == 512
+    restored = decoded(result)
+    assert float(unit(restored) @ unit(EMBEDDING[:512])) > 0.999
+
+
+def test_embedding_binary_sign_bits():
+    result = handler.encode_embedding(EMBEDDING, "binary")
+    assert len(base64.b64decode(result["embedding"])) == 1024 // 8
+    assert decoded(result).tolist() == [int(v > 0) for v in EMBEDDING]
+
+
+@pytest.mark.parametrize(
+    "embedding, encoding_format, dimensions",
+    [(EMBEDDING, "float16", None), (EMBEDDING, "int8", 0.5), (EMBEDDING, "int8", 2048), ([[0.1, 0.2]] * 3, "int8", None)],
+)
+def test_embedding_invalid_requests(embedding, encoding_format, dimensions):
+    with pytest.raises(ValueError):
+        handler.encode_embedding(embedding, encoding_format, dimensions)
@@ -1,6 +1,6 @@
 #!/bin/bash
 # Lilapu — Start local AI servers
-# whisper.cpp on port 8081, llama.cpp (Bielik-7B) on port 8080
+# whisper.cpp on port 8081, llama.cpp (Bielik-7B) on port 8080, vector index on port 8082
 
 LILAPU_DIR="$(cd "$(dirname "$0")/.." && pwd)"
 
@@ -38,10 +38,26 @@ echo "🧠 Starting Bielik-7B (llama.cpp) on :8080..."
 # Na M1 8GB: -ngl 25 = kompromis z whisper-medium. Na GPU serwerze: -ngl 99 = pełna prędkość.
 LLAMA_PID=$!
 
+# Start local vector index (offline RAG search, embeddings from llama-server)
+VECTOR_PID=""
+# Every POST needs this token (Authorization: Bearer ...); the server creates the file on first start
+VECTOR_TOKEN_FILE="$HOME/.lilapu/vector-index.token"
+if python3 -c "import numpy, usearch" 2>/dev/null; then
+  echo "🔎 Starting vector index on :8082..."
+  VECTOR_PORT=8082 EMBEDDING_URL="http://localhost:8080/embedding" \
+    VECTOR_INDEX_TOKEN_FILE="$VECTOR_TOKEN_FILE" \
+    python3 "$LILAPU_DIR/vector-index/server.py" &
+  VECTOR_PID=$!
+else
+  echo "⚠️  Vector index skipped — run: pip3 install numpy usearch"
+fi
+
 echo ""
 echo "✅ AI servers starting:"
 echo "   Whisper: http://localhost:8081 (PID: $WHISPER_PID)"
 echo "   Bielik:  http://localhost:8080 (PID: $LLAMA_PID)"
+[ -n "$VECTOR_PID" ] && echo "   Vector:  http://localhost:8082 (PID: $VECTOR_PID)"
+[ -n "$VECTOR_PID" ] && echo "            token: $VECTOR_TOKEN_FILE"
 echo ""
 echo "💡 To stop: ./scripts/stop-ai.sh"
 echo ""
@@ -49,5 +65,6 @@ echo ""
 # Save PIDs for stop script
 echo "$WHISPER_PID" > "$LILAPU_DIR/scripts/.whisper.pid"
 echo "$LLAMA_PID" > "$LILAPU_DIR/scripts/.llama.pid"
+[ -n "$VECTOR_PID" ] && echo "$VECTOR_PID" > "$LILAPU_DIR/scripts/.vector.pid"
 
 wait
@@ -15,8 +15,15 @@ if [ -f "$LILAPU_DIR/scripts/.llama.pid" ]; then
   rm "$LILAPU_DIR/scripts/.llama.pid"
 fi
 
+if [ -f "$LILAPU_DIR/scripts/.vector.pid" ]; then
+  # SIGTERM — the index flushes pending writes before exiting
+  kill "$(cat "$LILAPU_DIR/scripts/.vector.pid")" 2>/dev/null && echo "   Vector index stopped"
+  rm "$LILAPU_DIR/scripts/.vector.pid"
+fi
+
 # Also kill any stray processes
 pkill -f "whisper-server" 2>/dev/null
 pkill -f "llama-server" 2>/dev/null
+pkill -f "vector-index/server.py" 2>/dev/null
 
 echo "✅ Done"
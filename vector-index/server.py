@@ -0,0 +1,539 @@
+"""
+Lilapu — local vector index (offline RAG)
+HNSW search over transcript chunk embeddings for desktop / offline mode,
+next to llama-server (--embeddings) started by scripts/start-ai.sh.
+
+Endpoints (JSON, http://127.0.0.1:8082):
+  POST /add     {"items": [{"id": "...", "doc": "...", "text" | "embedding": ..., "metadata": {...}}]}
+                Upsert — an existing id is replaced. "text" is embedded through llama-server.
+  POST /delete  {"ids": [...]} or {"doc": "..."}  (all chunks of one transcription)
+  POST /search  {"text" | "embedding": ..., "k": 5, "doc": "...", "filter": {"key": "value"}}
+  GET  /health  count, dimensions, quantisation, memory
+
+POST requests need "Content-Type: application/json" and "Authorization: Bearer <token>";
+the token is read from VECTOR_INDEX_TOKEN or VECTOR_INDEX_TOKEN_FILE (created on first start).
+
+"embedding" is a float list or the compact output of the RunPod embedding route
+({"embedding": "<base64>", "encoding_format": "int8", "scale": ...}).
+
+ZERO PLAINTEXT: like the Convex index, only vectors + metadata are stored — never chunk text.
+
+Storage: usearch HNSW with int8 (4x smaller than float32) or binary (32x) vectors.
+The saved index is memory-mapped (VECTOR_INDEX_MMAP) so an idle index lives in the page
+cache instead of the heap; the first write loads it into RAM until the next flush.
+"""
+
+import base64
+import hmac
+import http.server
+import json
+import logging
+import os
+import secrets
+import signal
+import sqlite3
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler
+
+import numpy as np
+from usearch.index import Index
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+logger = logging.getLogger(__name__)
+
+# ── Config ───────────────────────────────────────────────────────────
+# Loopback only by default — the index holds the user's private transcripts
+VECTOR_HOST = os.environ.get("VECTOR_HOST", "127.0.0.1")
+VECTOR_PORT = int(os.environ.get("VECTOR_PORT", "8082"))
+VECTOR_INDEX_DIR = os.path.expanduser(os.environ.get("VECTOR_INDEX_DIR", "~/.lilapu/vector-index"))
+# llama-server embedding endpoint, used for "text" inputs
+EMBEDDING_URL = os.environ.get("EMBEDDING_URL", "http://localhost:8080/embedding")
+EMBEDDING_TIMEOUT_SEC = float(os.environ.get("EMBEDDING_TIMEOUT_SEC", "30"))
+# Stored vector type: "i8" (default), "b1" (sign bits, Hamming distance), "f16", "f32".
+# Only used when a new index is created — an existing index keeps its own.
+VECTOR_QUANTIZATION = os.environ.get("VECTOR_QUANTIZATION", "i8").lower()
+# Keep only the leading N dimensions (re-normalised); 0 = full size
+VECTOR_DIMENSIONS = int(os.environ.get("VECTOR_DIMENSIONS", "0"))
+# HNSW graph: neighbours per node, candidate list size on insert / search
+HNSW_CONNECTIVITY = int(os.environ.get("HNSW_CONNECTIVITY", "16"))
+HNSW_EXPANSION_ADD = int(os.environ.get("HNSW_EXPANSION_ADD", "128"))
+HNSW_EXPANSION_SEARCH = int(os.environ.get("HNSW_EXPANSION_SEARCH", "64"))
+# Serve the saved index memory-mapped; the first write after a flush loads it into RAM
+VECTOR_INDEX_MMAP = os.environ.get("VECTOR_INDEX_MMAP", "true").lower() == "true"
+# Pending writes are persisted at most this often (and on shutdown)
+FLUSH_INTERVAL_SEC = float(os.environ.get("FLUSH_INTERVAL_SEC", "5"))
+MAX_K = int(os.environ.get("MAX_K", "100"))
+MAX_HTTP_BODY_BYTES = int(os.environ.get("MAX_HTTP_BODY_BYTES", str(32 * 1024 * 1024)))
+# Shared secret for POST requests — any web page can reach localhost, so loopback alone isn't enough.
+# Empty = read VECTOR_INDEX_TOKEN_FILE, generating it (mode 0600) on first start.
+VECTOR_INDEX_TOKEN = os.environ.get("VECTOR_INDEX_TOKEN", "")
+VECTOR_INDEX_TOKEN_FILE = os.path.expanduser(
+    os.environ.get("VECTOR_INDEX_TOKEN_FILE", "~/.lilapu/vector-index.token")
+)
+
+QUANTIZATIONS = ("i8", "b1", "f16", "f32")
+ALLOWED_ORIGINS = ("tauri://localhost", "http://tauri.localhost")
+
+
+# ── Embedding input ──────────────────────────────────────────────────
+
+def decode_embedding(value) -> np.ndarray:
+    """Float list, or the compact dict returned by the RunPod embedding route."""
+    if not isinstance(value, dict):
+        vec = np.asarray(value, dtype=np.float32)
+    else:
+        data = base64.b64decode(value["embedding"])
+        fmt = value.get("encoding_format", "base64")
+        if fmt == "base64":
+            vec = np.frombuffer(data, dtype="<f4").astype(np.float32)
+        elif fmt == "int8":
+            vec = np.frombuffer(data, dtype=np.int8).astype(np.float32) * float(value.get("scale", 1.0))
+        elif fmt == "binary":
+            bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8))[: int(value["dimensions"])]
+            vec = bits.astype(np.float32) * 2 - 1
+        else:
+            raise ValueError(f"Unsupported encoding_format: {fmt!r}")
+    # llama-server returns one row per token when the model has no pooling
+    if vec.ndim == 2:
+        vec = vec.mean(axis=0)
+    if vec.ndim != 1 or vec.size == 0:
+        raise ValueError("Embedding must be a non-empty vector")
+    return vec
+
+
+def embed_text(text: str) -> np.ndarray:
+    """Embed through the local llama-server (old and new /embedding response shapes)."""
+    request = urllib.request.Request(
+        EMBEDDING_URL,
+        data=json.dumps({"content": text}).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request, timeout=EMBEDDING_TIMEOUT_SEC) as response:
+        result = json.loads(response.read())
+    if isinstance(result, list):
+        result = result[0]
+    return decode_embedding(result["embedding"])
+
+
+def item_vector(item: dict) -> np.ndarray:
+    if item.get("embedding") is not None:
+        return decode_embedding(item["embedding"])
+    if item.get("text"):
+        return embed_text(item["text"])
+    raise ValueError("Missing text or embedding")
+
+
+# ── Vector store ─────────────────────────────────────────────────────
+
+class VectorStore:
+    """usearch HNSW index + SQLite id/metadata table, flushed together.
+
+    usearch keys are the SQLite row ids; the table maps them to the caller's
+    chunk id, the document (transcription) it belongs to and its metadata.
+    """
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.index_path = os.path.join(directory, "index.usearch")
+        self.lock = threading.RLock()
+        self.dirty = False
+        self.db = sqlite3.connect(os.path.join(directory, "meta.sqlite3"), check_same_thread=False)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key INTEGER PRIMARY KEY AUTOINCREMENT,
+                id TEXT UNIQUE NOT NULL,
+                doc TEXT,
+                metadata TEXT
+            );
+            CREATE INDEX IF NOT EXISTS entries_doc ON entries(doc);
+            CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value TEXT);
+        """)
+        settings = dict(self.db.execute("SELECT name, value FROM settings"))
+        self.quantization = settings.get("quantization", VECTOR_QUANTIZATION)
+        self.ndim = int(settings["ndim"]) if "ndim" in settings else None
+        if self.quantization not in QUANTIZATIONS:
+            raise ValueError(f"VECTOR_QUANTIZATION must be one of {', '.join(QUANTIZATIONS)}")
+        if self.quantization != VECTOR_QUANTIZATION:
+            logger.warning(f"Existing index uses {self.quantization}, ignoring VECTOR_QUANTIZATION={VECTOR_QUANTIZATION}")
+
+        self.index = None
+        self.mapped = False
+        if self.ndim is not None and os.path.exists(self.index_path):
+            self.index = Index.restore(self.index_path, view=VECTOR_INDEX_MMAP)
+            self.mapped = VECTOR_INDEX_MMAP
+            self._configure(self.index)
+            self._reconcile()
+        logger.info(
+            f"Vector index: {self.count()} vectors, {self.ndim or '?'} dims, {self.quantization}"
+            f"{' (memory-mapped)' if self.mapped else ''} in {directory}"
+        )
+
+    def _new_index(self) -> Index:
+        return Index(
+            ndim=self.ndim,
+            metric="hamming" if self.quantization == "b1" else "cos",
+            dtype=self.quantization,
+            connectivity=HNSW_CONNECTIVITY,
+            expansion_add=HNSW_EXPANSION_ADD,
+            expansion_search=HNSW_EXPANSION_SEARCH,
+        )
+
+    def _configure(self, index: Index):
+        index.expansion_add = HNSW_EXPANSION_ADD
+        index.expansion_search = HNSW_EXPANSION_SEARCH
+
+    def _reconcile(self):
+        """Drop rows whose vectors missed the last index save (crash between the two)."""
+        keys = [key for (key,) in self.db.execute("SELECT key FROM entries")]
+        missing = [key for key in keys if key not in self.index]
+        if missing:
+            self.db.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key in missing])
+            self.db.commit()
+            logger.warning(f"Vector index: dropped {len(missing)} entries without a saved vector — re-add them")
+        orphans = len(self.index) - (len(keys) - len(missing))
+        if orphans > 0:
+            known = set(keys)
+            self._writable()
+            stale = [int(key) for key in self.index.keys if int(key) not in known]
+            self.index.remove(stale)
+            self.dirty = True
+            logger.warning(f"Vector index: removed {len(stale)} vectors without metadata")
+
+    def _writable(self):
+        # usearch views are read-only — load the file into RAM before mutating
+        if self.mapped:
+            self.index = Index.restore(self.index_path, view=False)
+            self._configure(self.index)
+            self.mapped = False
+        elif self.index is None:
+            self.index = self._new_index()
+
+    def prepare(self, vec: np.ndarray) -> np.ndarray:
+        """Truncate, re-normalise and check the size against the index."""
+        if VECTOR_DIMENSIONS and vec.size > VECTOR_DIMENSIONS:
+            vec = vec[:VECTOR_DIMENSIONS]
+        norm = float(np.linalg.norm(vec))
+        if norm > 0:
+            vec = vec / norm
+        if self.ndim is not None and vec.size != self.ndim:
+            raise ValueError(f"Embedding has {vec.size} dimensions, index expects {self.ndim}")
+        return vec
+
+    def _encode(self, vectors: np.ndarray) -> np.ndarray:
+        if self.quantization == "b1":
+            return np.packbits(vectors > 0, axis=1)
+        if self.quantization == "i8":
+            # Per-vector scale: usearch's own cast assumes components near ±1, which
+            # leaves unit vectors of ~1000 dims with a handful of levels
+            peak = np.abs(vectors).max(axis=1, keepdims=True)
+            peak[peak == 0] = 1.0
+            return np.round(vectors / peak * 127).astype(np.int8)
+        return vectors
+
+    def add(self, items: list) -> int:
+        # Last occurrence wins when a batch repeats an id
+        items = list({str(item["id"]): item for item in items}.values())
+        vectors = [self.prepare(item_vector(item)) for item in items]
+        with self.lock:
+            if self.ndim is None:
+                self.ndim = int(vectors[0].size)
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO settings (name, value) VALUES (?, ?)",
+                    [("ndim", str(self.ndim)), ("quantization", self.quantization)],
+                )
+            vectors = np.stack([self.prepare(vec) for vec in vectors]).astype(np.float32)
+            self._writable()
+            keys = []
+            for item in items:
+                chunk_id = str(item["id"])
+                row = self.db.execute("SELECT key FROM entries WHERE id = ?", (chunk_id,)).fetchone()
+                if row is not None:
+                    self.index.remove(row[0])
+                    self.db.execute("DELETE FROM entries WHERE key = ?", (row[0],))
+                cursor = self.db.execute(
+                    "INSERT INTO entries (id, doc, metadata) VALUES (?, ?, ?)",
+                    (chunk_id, item.get("doc"), json.dumps(item.get("metadata") or {})),
+                )
+                keys.append(cursor.lastrowid)
+            self.index.add(np.array(keys, dtype=np.uint64), self._encode(vectors))
+            self.dirty = True
+        return len(keys)
+
+    def delete(self, ids=None, doc=None) -> int:
+        with self.lock:
+            if doc is not None:
+                rows = self.db.execute("SELECT key FROM entries WHERE doc = ?", (doc,)).fetchall()
+            else:
+                rows = [
+                    row for chunk_id in ids or []
+                    for row in self.db.execute("SELECT key FROM entries WHERE id = ?", (str(chunk_id),))
+                ]
+            keys = [key for (key,) in rows]
+            if not keys:
+                return 0
+            self._writable()
+            self.index.remove(keys)
+            self.db.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key in keys])
+            self.dirty = True
+        return len(keys)
+
+    def search(self, vec: np.ndarray, k: int, doc=None, where=None) -> list:
+        where = where or {}
+        with self.lock:
+            if self.index is None or len(self.index) == 0:
+                return []
+            query = self._encode(self.prepare(vec).astype(np.float32)[np.newaxis])[0]
+            if doc is not None:
+                return self._search_doc(query, k, doc, where)
+            # Metadata filters are applied after the ANN search — over-fetch until k survive
+            fetch = k if not where else k * 4
+            while True:
+                matches = self.index.search(query, min(fetch, len(self.index)))
+                results = []
+                for key, distance in zip(matches.keys, matches.distances):
+                    row = self.db.execute(
+                        "SELECT id, doc, metadata FROM entries WHERE key = ?", (int(key),)
+                    ).fetchone()
+                    if row is None:
+                        continue
+                    metadata = json.loads(row[2])
+                    if any(metadata.get(name) != value for name, value in where.items()):
+                        continue
+                    results.append({
+                        "id": row[0],
+                        "doc": row[1],
+                        "score": round(self._score(float(distance)), 4),
+                        "metadata": metadata,
+                    })
+                if len(results) >= k or fetch >= len(self.index):
+                    return results[:k]
+                fetch *= 4
+
+    def _search_doc(self, query: np.ndarray, k: int, doc: str, where: dict) -> list:
+        """Exact scan over one document's vectors — a transcription has tens of chunks,
+        far fewer than the graph walk would have to skip over."""
+        rows = []
+        for key, chunk_id, metadata in self.db.execute(
+            "SELECT key, id, metadata FROM entries WHERE doc = ?", (doc,)
+        ):
+            metadata = json.loads(metadata)
+            if key in self.index and all(metadata.get(name) == value for name, value in where.items()):
+                rows.append((key, chunk_id, metadata))
+        if not rows:
+            return []
+        stored = np.stack(self.index.get(np.array([row[0] for row in rows], dtype=np.uint64)))
+        if self.quantization == "b1":
+            distances = np.unpackbits(stored ^ query, axis=1)[:, : self.ndim].sum(axis=1)
+        else:
+            stored = stored.astype(np.float32)
+            q = query.astype(np.float32)
+            norms = np.linalg.norm(stored, axis=1) * np.linalg.norm(q)
+            distances = 1.0 - (stored @ q) / np.maximum(norms, 1e-12)
+        order = np.argsort(distances)[:k]
+        return [
+            {
+                "id": rows[i][1],
+                "doc": doc,
+                "score": round(self._score(float(distances[i])), 4),
+                "metadata": rows[i][2],
+            }
+            for i in order
+        ]
+
+    def _score(self, distance: float) -> float:
+        # Cosine similarity, or the share of matching sign bits for binary vectors
+        if self.quantization == "b1":
+            return 1.0 - distance / self.ndim
+        return 1.0 - distance
+
+    def count(self) -> int:
+        return len(self.index) if self.index is not None else 0
+
+    def flush(self):
+        """Save index + metadata; in mmap mode the saved file is mapped again."""
+        with self.lock:
+            if not self.dirty:
+                return
+            start = time.monotonic()
+            tmp_path = self.index_path + ".tmp"
+            self.index.save(tmp_path)
+            os.replace(tmp_path, self.index_path)
+            self.db.commit()
+            if VECTOR_INDEX_MMAP:
+                self.index = Index.restore(self.index_path, view=True)
+                self._configure(self.index)
+                self.mapped = True
+            self.dirty = False
+            logger.info(f"Vector index saved: {self.count()} vectors in {(time.monotonic() - start) * 1000:.0f} ms")
+
+    def status(self) -> dict:
+        with self.lock:
+            return {
+                "status": "ok",
+                "count": self.count(),
+                "dimensions": self.ndim,
+                "quantization": self.quantization,
+                "memory_mapped": self.mapped,
+                "memory_bytes": self.index.memory_usage if self.index is not None else 0,
+                "file_bytes": os.path.getsize(self.index_path) if os.path.exists(self.index_path) else 0,
+            }
+
+
+store = None
+
+
+def flush_loop(stop: threading.Event):
+    while not stop.wait(FLUSH_INTERVAL_SEC):
+        try:
+            store.flush()
+        except Exception as e:
+            logger.error(f"Vector index flush failed: {e}")
+
+
+# ── Access token ─────────────────────────────────────────────────────
+
+def load_token() -> str:
+    """VECTOR_INDEX_TOKEN, else the token file — created with a fresh random token if missing."""
+    if VECTOR_INDEX_TOKEN:
+        return VECTOR_INDEX_TOKEN
+    try:
+        with open(VECTOR_INDEX_TOKEN_FILE) as f:
+            token = f.read().strip()
+        if token:
+            return token
+    except FileNotFoundError:
+        pass
+
+    token = secrets.token_urlsafe(32)
+    os.makedirs(os.path.dirname(VECTOR_INDEX_TOKEN_FILE), exist_ok=True)
+    fd = os.open(VECTOR_INDEX_TOKEN_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(token + "\n")
+    logger.info(f"Access token written to {VECTOR_INDEX_TOKEN_FILE}")
+    return token
+
+
+access_token = ""
+
+
+# ── HTTP API ─────────────────────────────────────────────────────────
+
+class VectorHandler(BaseHTTPRequestHandler):
+    """HTTP handler for /add, /delete, /search and /health."""
+
+    def do_GET(self):
+        if self.path != "/health":
+            self._json(404, {"error": "Not found"})
+            return
+        self._json(200, store.status())
+
+    def do_POST(self):
+        if self.path not in ("/add", "/delete", "/search"):
+            self._json(404, {"error": "Not found"})
+            return
+
+        if not self._authorized():
+            self._json(401, {"error": "Missing or invalid token"})
+            return
+
+        # A text/plain or form POST needs no CORS preflight — only accept real JSON requests
+        if self.headers.get_content_type() != "application/json":
+            self._json(415, {"error": "Content-Type must be application/json"})
+            return
+
+        content_length = int(self.headers.get("Content-Length", 0))
+        if content_length > MAX_HTTP_BODY_BYTES:
+            self._json(413, {"error": "Payload too large"})
+            return
+
+        try:
+            data = json.loads(self.rfile.read(content_length) or b"{}")
+            start = time.monotonic()
+            if self.path == "/add":
+                items = data.get("items", [data])
+                if not items or any("id" not in item for item in items):
+                    self._json(400, {"error": "Every item needs an id"})
+                    return
+                response = {"added": store.add(items)}
+            elif self.path == "/delete":
+                if "doc" not in data and "ids" not in data:
+                    self._json(400, {"error": "Missing ids or doc"})
+                    return
+                response = {"deleted": store.delete(data.get("ids"), data.get("doc"))}
+            else:
+                k = max(1, min(int(data.get("k", 5)), MAX_K))
+                vec = item_vector(data)
+                response = {"results": store.search(vec, k, data.get("doc"), data.get("filter"))}
+            response["took_ms"] = round((time.monotonic() - start) * 1000, 2)
+            self._json(200, response)
+        except (ValueError, KeyError, TypeError) as e:
+            self._json(400, {"error": str(e)})
+        except OSError as e:
+            # llama-server down / timed out
+            logger.error(f"Embedding request failed: {e}")
+            self._json(502, {"error": "Embedding server unavailable"})
+        except Exception as e:
+            logger.error(f"Vector index error on {self.path}: {e}")
+            self._json(500, {"error": "Internal server error"})
+
+    def do_OPTIONS(self):
+        """Handle CORS preflight."""
+        self.send_response(200)
+        self._cors()
+        self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
+        self.send_header("Access-Control-Allow-Headers", "Content-Type, Authorization")
+        self.end_headers()
+
+    def _authorized(self) -> bool:
+        scheme, _, token = self.headers.get("Authorization", "").partition(" ")
+        if not access_token or scheme.lower() != "bearer":
+            return False
+        return hmac.compare_digest(token.strip().encode(), access_token.encode())
+
+    def _cors(self):
+        origin = self.headers.get("Origin", "")
+        if origin in ALLOWED_ORIGINS or origin.startswith("http://localhost:"):
+            self.send_header("Access-Control-Allow-Origin", origin)
+
+    def _json(self, code: int, payload: dict):
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self._cors()
+        self.end_headers()
+        self.wfile.write(json.dumps(payload).encode())
+
+    def log_message(self, format, *args):
+        """Suppress default HTTP server logs (we use our own logger)."""
+        pass
+
+
+def main():
+    global store, access_token
+    store = VectorStore(VECTOR_INDEX_DIR)
+    access_token = load_token()
+
+    stop = threading.Event()
+    flusher = threading.Thread(target=flush_loop, args=(stop,), daemon=True)
+    flusher.start()
+
+    server = http.server.ThreadingHTTPServer((VECTOR_HOST, VECTOR_PORT), VectorHandler)
+
+    def shutdown(signum, frame):
+        # Runs on the main thread, which is inside serve_forever — stop it from another
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    logger.info(f"Vector index on http://{VECTOR_HOST}:{VECTOR_PORT} (/add, /delete, /search, /health)")
+    server.serve_forever()
+
+    stop.set()
+    store.flush()
+    logger.info("Vector index stopped")
+
+
+if __name__ == "__main__":
+    main()
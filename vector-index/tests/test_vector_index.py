@@ -0,0 +1,214 @@
+"""CPU-only tests for the local vector index — no llama-server needed (vectors passed directly)."""
+
+import base64
+import http.server
+import importlib.util
+import json
+import threading
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("usearch")
+
+_spec = importlib.util.spec_from_file_location(
+    "vector_index_server", Path(__file__).resolve().parents[1] / "server.py"
+)
+server = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(server)
+
+TOKEN = "test-token"
+
+
+# ── HTTP API ─────────────────────────────────────────────────────────
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "store", server.VectorStore(str(tmp_path / "index")))
+    monkeypatch.setattr(server, "access_token", TOKEN)
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), server.VectorHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+
+    def post(path, payload, headers=None):
+        request = urllib.request.Request(
+            f"http://127.0.0.1:{httpd.server_port}{path}",
+            data=json.dumps(payload).encode(),
+            headers=headers or {},
+            method="POST",
+        )
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    yield post
+    httpd.shutdown()
+    httpd.server_close()
+
+
+JSON_AUTH = {"Content-Type": "application/json", "Authorization": f"Bearer {TOKEN}"}
+ITEM = {"items": [{"id": "a", "doc": "d", "embedding": [0.1, 0.2, 0.3, 0.4]}]}
+
+
+def test_post_requires_token(api):
+    assert api("/add", ITEM, {"Content-Type": "application/json"})[0] == 401
+    assert api("/add", ITEM, {"Content-Type": "application/json", "Authorization": "Bearer nope"})[0] == 401
+    assert server.store.count() == 0
+
+
+def test_post_requires_json_content_type(api):
+    for content_type in ("text/plain", "application/x-www-form-urlencoded"):
+        headers = {"Content-Type": content_type, "Authorization": f"Bearer {TOKEN}"}
+        assert api("/add", ITEM, headers)[0] == 415
+    assert server.store.count() == 0
+
+
+def test_post_with_token_and_json(api):
+    status, body = api("/add", ITEM, {**JSON_AUTH, "Content-Type": "application/json; charset=utf-8"})
+    assert (status, body["added"]) == (200, 1)
+    status, body = api("/search", {"embedding": [0.1, 0.2, 0.3, 0.4], "k": 1}, JSON_AUTH)
+    assert status == 200
+    assert [r["id"] for r in body["results"]] == ["a"]
+
+
+def test_load_token_creates_private_file(tmp_path, monkeypatch):
+    path = tmp_path / "sub" / "token"
+    monkeypatch.setattr(server, "VECTOR_INDEX_TOKEN", "")
+    monkeypatch.setattr(server, "VECTOR_INDEX_TOKEN_FILE", str(path))
+    token = server.load_token()
+    assert len(token) >= 32
+    assert path.stat().st_mode & 0o777 == 0o600
+    assert server.load_token() == token
+
+
+# ── Embedding input ──────────────────────────────────────────────────
+
+def b64(array) -> str:
+    return base64.b64encode(np.asarray(array).tobytes()).decode()
+
+
+def test_decode_embedding_formats():
+    vec = np.array([0.5, -0.25, 0.0, 1.0], dtype=np.float32)
+    assert server.decode_embedding(vec.tolist()).tolist() == vec.tolist()
+    assert server.decode_embedding({"embedding": b64(vec.astype("<f4"))}).tolist() == vec.tolist()
+    int8 = {"embedding": b64(np.array([64, -32, 0, 127], dtype=np.int8)), "encoding_format": "int8", "scale": 1 / 127}
+    np.testing.assert_allclose(server.decode_embedding(int8), vec, atol=0.01)
+    binary = {"embedding": b64(np.packbits([1, 0, 0, 1])), "encoding_format": "binary", "dimensions": 4}
+    assert server.decode_embedding(binary).tolist() == [1, -1, -1, 1]
+    # Unpooled llama-server output: one row per token
+    assert server.decode_embedding([[1.0, 0.0], [0.0, 1.0]]).tolist() == [0.5, 0.5]
+
+
+def test_decode_embedding_rejects_bad_input():
+    with pytest.raises(ValueError):
+        server.decode_embedding([])
+    with pytest.raises(ValueError):
+        server.decode_embedding({"embedding": "", "encoding_format": "float16"})
+
+
+# ── Vector store ─────────────────────────────────────────────────────
+
+DIMS = 64
+rng = np.random.default_rng(0)
+VECTORS = rng.standard_normal((40, DIMS)).astype(np.float32)
+
+
+def items(start=0, stop=40):
+    return [
+        {"id": f"c{i}", "doc": f"doc{i % 4}", "embedding": VECTORS[i].tolist(), "metadata": {"chunkIndex": i, "even": i % 2 == 0}}
+        for i in range(start, stop)
+    ]
+
+
+def top(store, vec, k=1, **kwargs):
+    return [r["id"] for r in store.search(np.asarray(vec), k, kwargs.get("doc"), kwargs.get("where"))]
+
+
+@pytest.fixture(params=["i8", "b1"])
+def store(request, tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "VECTOR_QUANTIZATION", request.param)
+    return server.VectorStore(str(tmp_path / "index"))
+
+
+def test_add_and_search(store):
+    assert store.add(items()) == 40
+    assert store.count() == 40
+    assert all(top(store, VECTORS[i]) == [f"c{i}"] for i in range(0, 40, 7))
+    result = store.search(VECTORS[3], 1)[0]
+    assert result["doc"] == "doc3" and result["metadata"] == {"chunkIndex": 3, "even": False}
+    assert result["score"] > 0.9
+
+
+def test_upsert_replaces_existing_id(store):
+    store.add(items())
+    store.add([{"id": "c5", "doc": "moved", "embedding": VECTORS[0].tolist()}])
+    assert store.count() == 40
+    assert set(top(store, VECTORS[0], k=2)) == {"c0", "c5"}
+    assert "c5" not in top(store, VECTORS[5], k=3)
+    # Last occurrence wins within a batch
+    store.add([{"id": "x", "embedding": VECTORS[1].tolist()}, {"id": "x", "embedding": VECTORS[2].tolist()}])
+    assert store.count() == 41
+    assert "x" in top(store, VECTORS[2], k=2)
+
+
+def test_delete_by_ids_and_doc(store):
+    store.add(items())
+    assert store.delete(ids=["c0", "c1", "missing"]) == 2
+    assert store.delete(doc="doc2") == 10
+    assert store.delete(doc="doc2") == 0
+    assert store.count() == 28
+    assert "c0" not in top(store, VECTORS[0], k=5)
+    assert top(store, VECTORS[2], k=5, doc="doc2") == []
+
+
+def test_search_filters(store):
+    store.add(items())
+    doc_hits = store.search(VECTORS[1], 20, "doc1", None)
+    assert [r["id"] for r in doc_hits][0] == "c1"
+    assert {r["doc"] for r in doc_hits} == {"doc1"} and len(doc_hits) == 10
+    filtered = store.search(VECTORS[3], 5, None, {"even": True})
+    assert len(filtered) == 5 and all(r["metadata"]["even"] for r in filtered)
+    assert top(store, VECTORS[8], k=3, where={"chunkIndex": 8}) == ["c8"]
+
+
+def test_dimension_mismatch(store):
+    store.add(items(0, 1))
+    with pytest.raises(ValueError, match="index expects 64"):
+        store.add([{"id": "short", "embedding": [1.0, 0.0]}])
+
+
+def test_persists_and_reopens_mapped(store, tmp_path):
+    store.add(items())
+    store.flush()
+    reopened = server.VectorStore(str(tmp_path / "index"))
+    assert reopened.mapped and reopened.count() == 40
+    assert top(reopened, VECTORS[9]) == ["c9"]
+    reopened.add([{"id": "new", "embedding": VECTORS[9].tolist()}])  # view → RAM before writing
+    assert not reopened.mapped and reopened.count() == 41
+
+
+def test_reconcile_drops_rows_without_vectors(store, tmp_path):
+    store.add(items(0, 10))
+    store.flush()
+    # Crash after the metadata commit but before the index save
+    store.db.execute("INSERT INTO entries (id, doc, metadata) VALUES ('lost', 'doc0', '{}')")
+    store.db.commit()
+    reopened = server.VectorStore(str(tmp_path / "index"))
+    assert reopened.db.execute("SELECT COUNT(*) FROM entries").fetchone()[0] == 10
+    assert reopened.count() == 10
+
+
+def test_reconcile_removes_vectors_without_rows(store, tmp_path):
+    store.add(items(0, 10))
+    store.flush()
+    # Crash after the index save but before the metadata commit
+    store.db.execute("DELETE FROM entries WHERE id = 'c4'")
+    store.db.commit()
+    reopened = server.VectorStore(str(tmp_path / "index"))
+    assert reopened.count() == 9
+    assert "c4" not in top(reopened, VECTORS[4], k=9)
@@ -894,7 +894,7 @@ export const ocrHandwriting = action({
     },
     returns: v.string(),
     handler: async (ctx, args) => {
-        await requireAuth(ctx);
+        const identity = (await requireAuth(ctx)) as { subject: string };
         if (args.imageBase64.length > MAX_IMAGE_BASE64_SIZE) throw new Error("Image too large");
         if (!USE_OCR) {
             throw new Error("OCR not configured: set OCR_ENDPOINT_ID in Convex env");
@@ -906,6 +906,7 @@ export const ocrHandwriting = action({
             {
                 image_base64: args.imageBase64,
                 ocr_type: "format", // Markdown output
+                owner: identity.subject, // scopes the worker's result cache to this user
             },
             120_000
         );
@@ -373,8 +373,8 @@ export default function RecordPanel({
                         try {
                             // Get short-lived HMAC token from Convex (requires Clerk auth)
                             const token = await generateWsToken();
-                            // Send auth token as first message
-                            ws.send(JSON.stringify({ auth: token }));
+                            // Send auth token as first message (mode sets the admission class)
+                            ws.send(JSON.stringify({ auth: token, mode: "diarize" }));
                         } catch (err) {
                             reject(new Error("Failed to get WS auth token"));
                         }